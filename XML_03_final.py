@@ -1,15 +1,39 @@
 import os
 import json
 import fnmatch
+import tempfile
 import streamlit as st
+import filecache
+import instrumentation
+import jobs
 from xml.etree import ElementTree as ET
 from pathlib import Path
 from datetime import datetime
-from copy import deepcopy
+from ingest_core import build_index, path_nodes, export_bytes
+
+SPOOL_DIR = Path(tempfile.gettempdir()) / "ingest_optimizer"
+SPOOL_MAX_BYTES = int(os.getenv("INGEST_SPOOL_MAX_BYTES", 2 * 1024 ** 3))
+
+
+def spool_upload(uploaded, suffix):
+    # Stream the upload to a content-addressed temp file so the raw bytes
+    # never live in session state. A spooled file is only needed to (re)build
+    # its index, which load_index keeps cached.
+    file_hash, spool_path, size = filecache.spool(uploaded, SPOOL_DIR, suffix, SPOOL_MAX_BYTES)
+    return file_hash, str(spool_path), size
+
+
+@instrumentation.cached("load_index", st.cache_resource(max_entries=8))
+def load_index(file_hash, spool_path, suffix):
+    # Shared across reruns and sessions per content hash. Callers must
+    # deepcopy before mutating.
+    return build_index(spool_path, suffix)
+
 
 # Page configuration
 st.set_page_config(page_title="Ingest Optimizer", layout='wide')
 st.title("Ingest Optimizer")
+prof = instrumentation.begin("ingest_optimizer")
 
 # Global reset button
 if st.button("Reset alles", key='global_reset'):
@@ -21,66 +45,52 @@ col1, col2 = st.columns([3, 1])
 
 with col1:
     # --- Upload XML/JSON ---
-    if 'file_content' not in st.session_state:
+    if 'file_hash' not in st.session_state:
         uploaded = st.file_uploader("Upload XML of JSON bestand", type=["xml", "json"], key='uploader')
         if not uploaded:
             st.stop()
-        st.session_state['file_content'] = uploaded.read()
+        file_hash, spool_path, file_size = spool_upload(uploaded, Path(uploaded.name).suffix.lower())
+        st.session_state['file_hash'] = file_hash
+        st.session_state['file_path'] = spool_path
+        st.session_state['file_size'] = file_size
         st.session_state['file_name'] = uploaded.name
 
-    content = st.session_state['file_content']
+    file_hash = st.session_state['file_hash']
     uploaded_name = st.session_state['file_name']
     suffix = Path(uploaded_name).suffix.lower()
-    orig_size = len(content)
+    orig_size = st.session_state['file_size']
 
-    # Parse
-    if suffix == '.xml':
-        try:
-            tree = ET.ElementTree(ET.fromstring(content))
-            root = tree.getroot()
-        except ET.ParseError:
-            st.error("Ongeldige of lege XML.")
-            st.stop()
-        data_format = 'xml'
-        def collect_tags(elem, path=""):
-            tags = {}
-            for child in elem:
-                full = f"{path}/{child.tag}" if path else child.tag
-                tags.setdefault(full, []).append(child)
-                tags.update(collect_tags(child, full))
-            return tags
-        tags_map = {root.tag: [root]}
-        tags_map.update(collect_tags(root))
+    # Parse (cached per content hash)
+    prof.mark("parse")
+    filecache.touch(st.session_state['file_path'])
+    try:
+        index = load_index(file_hash, st.session_state['file_path'], suffix)
+    except ET.ParseError:
+        st.error("Ongeldige of lege XML.")
+        st.stop()
+    except json.JSONDecodeError:
+        st.error("Ongeldige of lege JSON.")
+        st.stop()
+    except FileNotFoundError:
+        st.error("Tijdelijk bestand niet meer beschikbaar, upload het bestand opnieuw.")
+        st.stop()
+    data_format = index['format']
+    tags_map = index['tags_map']
+    path_labels = index['path_labels']
+    if data_format == 'xml':
+        root = index['root']
+        seg_ids = index['seg_ids']
+        path_children = index['path_children']
+        node_paths = index['node_paths']
+        node_items = index['node_items']
     else:
-        try:
-            data = json.loads(content)
-        except json.JSONDecodeError:
-            st.error("Ongeldige of lege JSON.")
-            st.stop()
-        data_format = 'json'
-        def collect_keys(obj, path=""):
-            keys = {}
-            if isinstance(obj, dict):
-                for k, v in obj.items():
-                    full = f"{path}/{k}" if path else k
-                    keys.setdefault(full, []).append(v)
-                    keys.update(collect_keys(v, full))
-            elif isinstance(obj, list):
-                for item in obj:
-                    keys.update(collect_keys(item, path))
-            return keys
-        tags_map = collect_keys(data)
+        data = index['data']
     tags = sorted(tags_map.keys())
 
     # Overview\ n    st.subheader("Overzicht tags/keys")
     overview = []
     for tag in tags:
-        total = len(tags_map[tag])
-        if data_format == 'xml':
-            str_count = sum(1 for elem in tags_map[tag] if elem.text and elem.text.strip())
-        else:
-            str_count = sum(1 for v in tags_map[tag] if isinstance(v, str))
-        overview.append({'Tag/Key': tag, 'Aantal': total, 'String waarden': str_count})
+        overview.append({'Tag/Key': tag, 'Aantal': len(tags_map[tag]), 'String waarden': index['str_counts'][tag]})
     st.dataframe(overview)
 
     # Load filter
@@ -105,6 +115,7 @@ with col1:
                 st.session_state.pop(key, None)
 
     # Wildcard exclusion
+    prof.mark("filter")
     wildcard_input = st.text_input("Wildcard-patronen om uit te sluiten", key='wildcard_input', help="Gebruik comma-separated fnmatch-patronen")
     patterns = [p.strip() for p in wildcard_input.split(',') if p.strip()]
     wild_excl = sorted({m for pat in patterns for m in fnmatch.filter(tags, pat)})
@@ -117,8 +128,7 @@ with col1:
     # Ensure defaults are valid options to avoid Streamlit errors
     default = [t for t in raw_default if t in options]
     def format_label(tag):
-        import re
-        return re.sub(r"\{.*?\}", "", tag).strip()
+        return path_labels.get(tag, tag)
     include = st.multiselect("Selecteer tags/keys om op te nemen", options, default, format_func=format_label, key='include')
     exclude = [t for t in tags if t not in include or t in wild_excl]
 
@@ -128,105 +138,117 @@ with col1:
         badges = [f"<span style='background:#e0e0e0;color:#555;padding:4px 8px;margin:2px;border-radius:4px;'>{format_label(t)}</span>" for t in exclude]
         st.markdown(''.join(badges), unsafe_allow_html=True)
 
+    # Preview limits: only the top levels and first siblings are materialised
+    def xml_preview(elem, node, depth, max_items, include=None):
+        if len(elem) == 0:
+            return elem.text or ""
+        if depth <= 0:
+            return f"<{len(elem)} onderliggende elementen>"
+        result = {}
+        shown = 0
+        skipped = 0
+        kids = path_children[node]
+        for c in elem:
+            child_node = kids[seg_ids[c.tag]]
+            if include is not None and child_node not in include:
+                continue
+            if shown >= max_items:
+                skipped += 1
+                continue
+            shown += 1
+            child = xml_preview(c, child_node, depth - 1, max_items, include)
+            if c.tag in result:
+                if not isinstance(result[c.tag], list):
+                    result[c.tag] = [result[c.tag]]
+                result[c.tag].append(child)
+            else:
+                result[c.tag] = child
+        if skipped:
+            result["…"] = f"{skipped} meer elementen"
+        if include is not None and not result:
+            return elem.text or ""
+        return result
+
+    def json_preview(o, path, depth, max_items, include=None):
+        if isinstance(o, dict):
+            if depth <= 0:
+                return f"<{len(o)} keys>"
+            res = {}
+            shown = 0
+            skipped = 0
+            for k, v in o.items():
+                full = f"{path}/{k}" if path else k
+                if include is not None and full not in include:
+                    continue
+                if shown >= max_items:
+                    skipped += 1
+                    continue
+                shown += 1
+                res[k] = json_preview(v, full, depth - 1, max_items, include)
+            if skipped:
+                res["…"] = f"{skipped} meer keys"
+            return res
+        elif isinstance(o, list):
+            if depth <= 0:
+                return f"<{len(o)} items>"
+            lst = [json_preview(item, path, depth - 1, max_items, include) for item in o[:max_items]]
+            if len(o) > max_items:
+                lst.append(f"… {len(o) - max_items} meer items")
+            return lst
+        else:
+            return o
+
+    def render_preview(label, include=None):
+        # Start the preview at any path from the index to open deeper subtrees on demand
+        start_options = tags if include is None else [t for t in tags if t in include]
+        if data_format == 'xml':
+            start_options = [root.tag] + [t for t in start_options if t != root.tag]
+        else:
+            start_options = ["(root)"] + start_options
+        c_start, c_depth, c_items = st.columns([3, 1, 1])
+        start = c_start.selectbox("Toon vanaf pad", start_options, format_func=format_label, key=f'{label}_start')
+        depth = c_depth.number_input("Diepte", min_value=1, max_value=50, value=3, key=f'{label}_depth')
+        max_items = c_items.number_input("Max. items per niveau", min_value=1, max_value=1000, value=20, key=f'{label}_items')
+        if data_format == 'xml':
+            include_nodes = None if include is None else path_nodes(index, include)
+            if start == root.tag:
+                st.json({root.tag: xml_preview(root, 0, depth, max_items, include_nodes)})
+            else:
+                start_node = node_paths.index(start)
+                nodes = node_items[start_node]
+                previews = [xml_preview(e, start_node, depth, max_items, include_nodes) for e in nodes[:max_items]]
+                if len(nodes) > max_items:
+                    previews.append(f"… {len(nodes) - max_items} meer voorkomens")
+                st.json({start: previews[0] if len(previews) == 1 else previews})
+        else:
+            if start == "(root)":
+                st.json(json_preview(data, "", depth, max_items, include))
+            else:
+                values = tags_map.get(start, [])
+                previews = [json_preview(v, start, depth, max_items, include) for v in values[:max_items]]
+                if len(values) > max_items:
+                    previews.append(f"… {len(values) - max_items} meer voorkomens")
+                st.json({start: previews[0] if len(previews) == 1 else previews})
+
     # Checkbox to show original hierarchy
+    prof.mark("render")
     show_hierarchy = st.checkbox("Toon hiërarchie van bestand")
     if show_hierarchy:
         st.markdown("## Hiërarchie van het bestand")
-        if data_format == 'xml':
-            def xml_to_dict(elem):
-                children = list(elem)
-                if not children:
-                    return elem.text or ""
-                result = {}
-                for c in children:
-                    child_dict = xml_to_dict(c)
-                    if c.tag in result:
-                        if not isinstance(result[c.tag], list):
-                            result[c.tag] = [result[c.tag]]
-                        result[c.tag].append(child_dict)
-                    else:
-                        result[c.tag] = child_dict
-                return result
-            tree_dict = {root.tag: xml_to_dict(root)}
-            st.json(tree_dict)
-        else:
-            st.json(data)
+        render_preview('hierarchy')
 
     # Checkbox to show filtered hierarchy
     show_filtered = st.checkbox("Toon gefilterde hiërarchie van bestand")
     if show_filtered:
         st.markdown("## Gefilterde hiërarchie van het bestand")
-        if data_format == 'xml':
-            def xml_to_dict_filtered(elem, path=""):
-                children = list(elem)
-                res = {}
-                for c in children:
-                    full = f"{path}/{c.tag}" if path else c.tag
-                    if full in include:
-                        child = xml_to_dict_filtered(c, full)
-                        if c.tag in res:
-                            if not isinstance(res[c.tag], list):
-                                res[c.tag] = [res[c.tag]]
-                            res[c.tag].append(child)
-                        else:
-                            res[c.tag] = child
-                return res if res else (elem.text or "")
-            filtered = {root.tag: xml_to_dict_filtered(root)}
-            st.json(filtered)
-        else:
-            def json_to_dict_filtered(o, path=""):
-                if isinstance(o, dict):
-                    res = {}
-                    for k, v in o.items():
-                        full = f"{path}/{k}" if path else k
-                        if full in include:
-                            filtered_v = json_to_dict_filtered(v, full)
-                            res[k] = filtered_v
-                    return res
-                elif isinstance(o, list):
-                    lst = []
-                    for item in o:
-                        v = json_to_dict_filtered(item, path)
-                        lst.append(v)
-                    return lst
-                else:
-                    return o
-            filtered_json = json_to_dict_filtered(data)
-            st.json(filtered_json)
+        render_preview('filtered', set(include))
 
 with col2:
     st.header("Omvang")
-    @st.cache_data
-    def calc_size(excl):
-        if data_format == 'xml':
-            temp = deepcopy(root)
-            def pr(e, p=[]):
-                for c in list(e):
-                    full = '/'.join(p + [c.tag])
-                    if full in excl:
-                        e.remove(c)
-                    else:
-                        pr(c, p + [c.tag])
-            pr(temp)
-            return len(ET.tostring(temp, encoding='utf-8'))
-        else:
-            temp = deepcopy(data)
-            def pr(o, p=""):
-                if isinstance(o, dict):
-                    for k in list(o.keys()):
-                        full = f"{p}/{k}" if p else k
-                        if full in excl:
-                            del o[k]
-                        else:
-                            pr(o[k], full)
-                elif isinstance(o, list):
-                    for i in o: pr(i, p)
-            pr(temp)
-            return len(json.dumps(temp).encode())
-    new_size = calc_size(exclude)
-    st.write(f"Origineel: {orig_size:,} bytes")
-    st.write(f"Gefilterd: {new_size:,} bytes")
-    st.write(f"Besparing: {orig_size-new_size:,} bytes")
+    prof.mark("stats")
+    # The filtered size is that of the export below, so the document is
+    # pruned and serialised once, on the job pool
+    sizes = st.container()
 
     fn = st.text_input("Naam filter (opslaan als)", key='save_name')
     if fn:
@@ -234,35 +256,18 @@ with col2:
         st.download_button("Opslaan filter", data=cfg_json, file_name=f"{fn}.filter.json", mime='application/json')
 
     # Prepare output
+    prof.mark("export")
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     stem = Path(uploaded_name).stem
-    if data_format == 'xml':
-        out_root = deepcopy(root)
-        def prune(e, p=[]):
-            for c in list(e):
-                full = '/'.join(p + [c.tag])
-                if full in exclude:
-                    e.remove(c)
-                else:
-                    prune(c, p + [c.tag])
-        prune(out_root)
-        output_bytes = ET.tostring(out_root, encoding='utf-8', xml_declaration=True)
-        ext = '.xml'
-    else:
-        out_data = deepcopy(data)
-        def prune_any(o, p=""):
-            if isinstance(o, dict):
-                for k in list(o.keys()):
-                    full = f"{p}/{k}" if p else k
-                    if full in exclude:
-                        del o[k]
-                    else:
-                        prune_any(o[k], full)
-            elif isinstance(o, list):
-                for i in o: prune_any(i, p)
-        prune_any(out_data)
-        output_bytes = json.dumps(out_data, indent=2).encode('utf-8')
-        ext = '.json'
+    # Runs on the shared job pool; a filter change during the export
+    # releases it and starts the export for the new selection
+    job = jobs.submit('export', (file_hash, tuple(exclude)), export_bytes, index, tuple(exclude))
+    output_bytes = jobs.wait(job, "Bestand voorbereiden...")
+    new_size = len(output_bytes)
+    sizes.write(f"Origineel: {orig_size:,} bytes")
+    sizes.write(f"Gefilterd: {new_size:,} bytes")
+    sizes.write(f"Besparing: {orig_size-new_size:,} bytes")
+    ext = '.xml' if data_format == 'xml' else '.json'
     optimized_name = f"{stem}_optimized_{ts}{ext}"
     # Download optimized file
     st.download_button(
@@ -293,3 +298,5 @@ with col2:
         mime='text/plain',
         key='download_log'
     )
+
+prof.finish()
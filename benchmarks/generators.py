@@ -0,0 +1,116 @@
+# Seeded synthetic datasets for the benchmarks. The same seed and size always
+# produce the same bytes, so timings stay comparable between runs.
+import json
+import random
+from datetime import datetime, timedelta
+
+RDF_NS = "http://example.org/"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+GEO_LAT = "http://www.w3.org/2003/01/geo/wgs84_pos#lat"
+GEO_LONG = "http://www.w3.org/2003/01/geo/wgs84_pos#long"
+MDTO_NS = "http://www.nationaalarchief.nl/mdto"
+WORDS = [
+    "water", "dijk", "rapport", "kaart", "archief", "gemeente", "polder", "sluis",
+    "brug", "haven", "foto", "notulen", "besluit", "verslag", "register", "akte",
+]
+REGIONS = ["noord", "oost", "zuid", "west"]
+EXTENSIONS = ["pdf", "docx", "jpg", "tif", "xml", "msg"]
+
+
+def random_date(rng, start=datetime(2000, 1, 1), days=9000):
+    return start + timedelta(days=rng.randrange(days), seconds=rng.randrange(86400))
+
+
+def rdf_ntriples(n_triples, n_types=5, geo=True, dates=True, seed=0):
+    # N-Triples with typed subjects, labels, numeric literals, links between
+    # subjects and optional geo coordinates and dates per subject
+    rng = random.Random(seed)
+    per_subject = 3 + (2 if geo else 0) + (1 if dates else 0)
+    n_subjects = max(1, n_triples // per_subject)
+    lines = []
+    for i in range(n_subjects):
+        s = f"<{RDF_NS}item/{i}>"
+        lines.append(f"{s} <{RDF_TYPE}> <{RDF_NS}Type{rng.randrange(n_types)}> .")
+        lines.append(f'{s} <{RDF_NS}label> "{rng.choice(WORDS)} {i}" .')
+        lines.append(f"{s} <{RDF_NS}relatedTo> <{RDF_NS}item/{rng.randrange(n_subjects)}> .")
+        if geo:
+            lines.append(f'{s} <{GEO_LAT}> "{rng.uniform(50.7, 53.5):.5f}" .')
+            lines.append(f'{s} <{GEO_LONG}> "{rng.uniform(3.3, 7.2):.5f}" .')
+        if dates:
+            lines.append(f'{s} <{RDF_NS}dateCreated> "{random_date(rng).date().isoformat()}" .')
+    return "\n".join(lines[:max(n_triples, 1)]) + "\n"
+
+
+def nested_xml(n_records, depth=3, fanout=3, seed=0):
+    # MDTO-like document: namespaced records with nested, repeated children
+    rng = random.Random(seed)
+    parts = [f'<?xml version="1.0"?>\n<m:MDTO xmlns:m="{MDTO_NS}">']
+
+    def element(level):
+        name = rng.choice(WORDS)
+        if level >= depth:
+            return f"<m:{name}>{rng.choice(WORDS)} {rng.randrange(1000)}</m:{name}>"
+        kids = "".join(element(level + 1) for _ in range(rng.randint(1, fanout)))
+        return f"<m:{name}>{kids}</m:{name}>"
+
+    for i in range(n_records):
+        parts.append(
+            f"<m:informatieobject><m:naam>Doc {i}</m:naam>"
+            f"<m:id><m:waarde>{i}</m:waarde><m:bron>{rng.choice(REGIONS)}</m:bron></m:id>"
+            + element(1) + "</m:informatieobject>"
+        )
+    parts.append("</m:MDTO>")
+    return "".join(parts)
+
+
+def nested_json(n_records, depth=3, fanout=3, seed=0):
+    rng = random.Random(seed)
+
+    def node(level):
+        if level >= depth:
+            return f"{rng.choice(WORDS)} {rng.randrange(1000)}"
+        return {rng.choice(WORDS): node(level + 1) for _ in range(rng.randint(1, fanout))}
+
+    records = [
+        {"naam": f"Doc {i}", "id": {"waarde": i, "bron": rng.choice(REGIONS)}, "inhoud": node(1)}
+        for i in range(n_records)
+    ]
+    return json.dumps({"records": records})
+
+
+def metadata_csv(n_docs, extra_fields=6, seed=0):
+    # Long-format metadata (file_key, metadata_field, metadata_value) as read
+    # by the metadata viewer, with dates and LLM summary fields
+    rng = random.Random(seed)
+    lines = ["file_key,metadata_field,metadata_value"]
+    for i in range(n_docs):
+        key = f"doc_{i:07d}"
+        created = random_date(rng)
+        rows = [
+            ("file_extension", rng.choice(EXTENSIONS)),
+            ("title", f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {i}"),
+            ("file_created", created.strftime("%Y-%m-%d %H:%M:%S")),
+            ("file_modified", (created + timedelta(days=rng.randrange(400))).strftime("%Y-%m-%d %H:%M:%S")),
+            ("ai_summary", " ".join(rng.choice(WORDS) for _ in range(12))),
+            ("image_description", " ".join(rng.choice(WORDS) for _ in range(8))),
+        ]
+        rows += [(f"field_{j}", f"{rng.choice(WORDS)} {rng.randrange(100)}") for j in range(extra_fields)]
+        lines.extend(f'{key},{field},"{value}"' for field, value in rows)
+    return "\n".join(lines) + "\n"
+
+
+def wide_csv(n_rows, n_numeric=6, n_categorical=4, seed=0):
+    # Tabular data for the dashboard: an id, numeric, categorical and date columns
+    rng = random.Random(seed)
+    header = (
+        ["id"] + [f"num_{j}" for j in range(n_numeric)]
+        + [f"cat_{j}" for j in range(n_categorical)] + ["name", "date"]
+    )
+    lines = [",".join(header)]
+    for i in range(n_rows):
+        row = [str(i)]
+        row += [f"{rng.gauss(100, 25):.3f}" if j % 2 else str(rng.randrange(1000)) for j in range(n_numeric)]
+        row += [rng.choice(REGIONS if j % 2 else WORDS) for j in range(n_categorical)]
+        row += [f"naam {i}", random_date(rng).date().isoformat()]
+        lines.append(",".join(row))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,155 @@
+# Benchmarks for the hot paths of the apps on seeded synthetic data.
+#
+#   python -m benchmarks.run                       # all suites, small + medium
+#   python -m benchmarks.run --sizes large --suites dashboard metadata
+#   python -m benchmarks.run --json results.json   # also write the results
+#
+# Each case is timed (best of --repeat runs) and run once more under
+# tracemalloc for the peak Python heap. Allocations made outside the Python
+# allocator (e.g. pyarrow buffers) are not included in the peak.
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import generators  # noqa: E402
+
+SIZES = {'small': 1_000, 'medium': 10_000, 'large': 100_000}
+
+
+def measure(setup, fn, repeat):
+    # (best wall time in seconds, peak traced memory in bytes)
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def write_file(workdir, name, text):
+    path = Path(workdir) / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def rdf_cases(n, workdir):
+    from rdf_core import (
+        PALETTE, load_triples, triple_stats, regex_filter, node_types, build_network, geo_points,
+    )
+    path = write_file(workdir, "data.nt", generators.rdf_ntriples(6 * n))
+    g, df = load_triples(str(path))
+    types = node_types(df)
+    type_colors = {t: PALETTE[i % len(PALETTE)] for i, t in enumerate(sorted(set(types.values())))}
+    pred_counts = df['Predicate'].value_counts()
+    pred_colors = {p: PALETTE[i % len(PALETTE)] for i, p in enumerate(sorted(pred_counts.index))}
+    return [
+        ("rdf.load_triples", lambda: (str(path),), load_triples),
+        ("rdf.triple_stats", lambda: (df,), triple_stats),
+        ("rdf.regex_filter", lambda: (df, r"item/\d*7$", "label|related", ""), regex_filter),
+        ("rdf.build_network", lambda: (df, types, type_colors, pred_colors, pred_counts), build_network),
+        ("rdf.geo_points", lambda: (df,), geo_points),
+    ]
+
+
+def ingest_cases(n, workdir):
+    from ingest_core import build_index, export_bytes
+    xml_path = write_file(workdir, "data.xml", generators.nested_xml(n))
+    json_path = write_file(workdir, "data.json", generators.nested_json(n))
+    xml_index = build_index(str(xml_path), '.xml')
+    json_index = build_index(str(json_path), '.json')
+    xml_excl = sorted(xml_index['tags_map'])[::3]
+    json_excl = sorted(json_index['tags_map'])[::3]
+    return [
+        ("xml.build_index", lambda: (str(xml_path), '.xml'), build_index),
+        ("xml.export_bytes", lambda: (xml_index, xml_excl), export_bytes),
+        ("json.build_index", lambda: (str(json_path), '.json'), build_index),
+        ("json.export_bytes", lambda: (json_index, json_excl), export_bytes),
+    ]
+
+
+def metadata_cases(n, workdir):
+    from metadata_core import build_metadata_store, select_rows, keyword_filter, write_mdto_json
+    path = write_file(workdir, "metadata.csv", generators.metadata_csv(n))
+    store = build_metadata_store(str(path))
+    fields = sorted(set().union(*store['type_fields'].values()))
+    selected = select_rows(store, store['types'], fields)
+    # The search index is built lazily inside the store, so every run gets a fresh store
+    return [
+        ("metadata.build_store", lambda: (str(path),), build_metadata_store),
+        ("metadata.select_rows", lambda: (store, store['types'], fields), select_rows),
+        ("metadata.keyword_filter", lambda: (build_metadata_store(str(path)), selected, "dijk", True),
+         lambda s, rows, kw, partial: keyword_filter(s, rows, kw, partial)),
+        ("metadata.write_mdto_json", lambda: (selected,), lambda rows: write_mdto_json(rows).close()),
+    ]
+
+
+def dashboard_cases(n, workdir):
+    from dashboard_core import read_csv_typed, apply_filters, line_data, category_data, write_export
+    path = write_file(workdir, "wide.csv", generators.wide_csv(10 * n))
+    df = read_csv_typed(path)
+    filters = {'num_0': (100, 800), 'cat_1': ['noord', 'zuid']}
+    out = Path(workdir) / "export"
+
+    def export(fmt):
+        return lambda frame: write_export([frame], out, fmt)
+
+    return [
+        ("dashboard.read_csv_typed", lambda: (path,), read_csv_typed),
+        ("dashboard.apply_filters", lambda: (df, filters), apply_filters),
+        ("dashboard.line_data", lambda: (df, 'id', 'num_1', 5000), line_data),
+        ("dashboard.category_data", lambda: (df, 'cat_0', 'num_1', 5000), category_data),
+        ("dashboard.export_csv", lambda: (df,), export("CSV")),
+        ("dashboard.export_xml", lambda: (df,), export("XML")),
+    ]
+
+
+SUITES = {
+    'rdf': rdf_cases,
+    'ingest': ingest_cases,
+    'metadata': metadata_cases,
+    'dashboard': dashboard_cases,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app hot paths on synthetic data.")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'])
+    parser.add_argument('--suites', nargs='+', choices=list(SUITES), default=list(SUITES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'case':<28} {'size':<8} {'time (s)':>10} {'peak (MB)':>10}")
+    for size in args.sizes:
+        for suite in args.suites:
+            with tempfile.TemporaryDirectory() as workdir:
+                for name, setup, fn in SUITES[suite](SIZES[size], workdir):
+                    seconds, peak = measure(setup, fn, args.repeat)
+                    results.append({'case': name, 'size': size, 'n': SIZES[size], 'seconds': seconds, 'peak_bytes': peak})
+                    print(f"{name:<28} {size:<8} {seconds:>10.4f} {peak / 1e6:>10.1f}", flush=True)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
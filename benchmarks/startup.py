@@ -0,0 +1,104 @@
+# Cold-start budget for the apps: the first run of each app (nothing uploaded
+# yet, i.e. the first paint) in a fresh interpreter, plus the heavy modules
+# that run imported.
+#
+#   python -m benchmarks.startup                   # all apps, report only
+#   python -m benchmarks.startup --apps dashboard --repeat 5
+#   python -m benchmarks.startup --check           # exit 1 when over budget
+#
+# Importing Streamlit itself is timed separately: every app pays it and no
+# app can avoid it. --check fails when an app's first run exceeds its budget
+# (scaled with --scale for slower machines) or when it imports one of the
+# DEFERRED modules, which the apps only load once their feature is used.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# app name: (script, first-run budget in ms)
+APPS = {
+    'dashboard': ('flexibel_dashboard_app_v5.py', 500),
+    'ingest': ('XML_03_final.py', 400),
+    'metadata': ('viewer_12_35lc.py', 400),
+    'rdf': ('rdf_viewer_06ok.py', 400),
+    'rdf_02': ('rdf_viewer_02.py', 400),
+}
+DEFERRED = [
+    'pandas', 'numpy', 'pyarrow', 'duckdb', 'rdflib', 'pyvis', 'folium',
+    'streamlit_folium', 'plotly.express', 'openai',
+]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+before = set(sys.modules)
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.run()
+done = time.perf_counter()
+print(json.dumps({
+    'streamlit_ms': (imported - start) * 1000,
+    'first_run_ms': (done - imported) * 1000,
+    'errors': [str(e.value) for e in at.exception],
+    'deferred_loaded': [m for m in json.loads(sys.argv[2]) if m in sys.modules and m not in before],
+}))
+"""
+
+
+def cold_start(script):
+    # One fresh interpreter; wall time includes interpreter start-up
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, str(ROOT / script), json.dumps(DEFERRED)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env={**os.environ, 'APP_DEBUG': '0'},
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold start of the apps against a budget.")
+    parser.add_argument('--apps', nargs='+', choices=list(APPS), default=list(APPS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply the budgets, e.g. 2 on slow CI machines")
+    parser.add_argument('--check', action='store_true', help="exit 1 when an app is over budget")
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    failed = False
+    print(f"{'app':<10} {'streamlit (ms)':>15} {'first run (ms)':>15} {'budget':>8} {'process (ms)':>13}  deferred loaded")
+    for name in args.apps:
+        script, budget = APPS[name]
+        runs = [cold_start(script) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r['first_run_ms'])
+        budget *= args.scale
+        over = best['first_run_ms'] > budget or best['deferred_loaded'] or best['errors']
+        failed = failed or bool(over)
+        results.append({'app': name, 'script': script, 'budget_ms': budget, **best})
+        print(
+            f"{name:<10} {best['streamlit_ms']:>15.0f} {best['first_run_ms']:>15.0f} {budget:>8.0f} "
+            f"{best['process_ms']:>13.0f}  {', '.join(best['deferred_loaded']) or '-'}"
+            + ("  OVER BUDGET" if over else ""),
+            flush=True,
+        )
+        for error in best['errors']:
+            print(f"  {error}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+    if args.check and failed:
+        sys.exit(1)
+    return results
+
+
+if __name__ == '__main__':
+    main()
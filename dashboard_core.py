@@ -0,0 +1,537 @@
+# Loading, filtering, charting and export of datasets for the Flexibel
+# Dashboard, in memory or out of core with DuckDB over a Parquet cache.
+#
+# numpy, pandas, pyarrow and duckdb are imported inside the functions that
+# use them: the app imports this module for the source helpers before any
+# data is loaded, and that first paint should not wait for the data stack.
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+
+import filecache
+
+# Optional: pyarrow enables the on-disk Parquet cache of ingested datasets
+HAS_PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+# Optional: duckdb enables the out-of-core query engine over the Parquet cache
+HAS_DUCKDB = importlib.util.find_spec("duckdb") is not None
+
+
+# --- INGESTION ---
+CACHE_DIR = Path(tempfile.gettempdir()) / "flexibel_dashboard"
+CACHE_MAX_BYTES = int(os.getenv("DASHBOARD_CACHE_MAX_BYTES", 10 * 1024 ** 3))
+CHUNK_ROWS = 250_000
+CATEGORY_RATIO = 0.5
+
+
+def spool_to_cache(stream, on_chunk=None):
+    # Stream a source to a content-addressed file in the cache directory
+    content_hash, path, _ = filecache.spool(stream, CACHE_DIR, ".csv", CACHE_MAX_BYTES, on_chunk)
+    return content_hash, path
+
+
+def touch_cache(content_hash):
+    # Mark a dataset (CSV and Parquet) as recently used
+    filecache.touch(*(CACHE_DIR / f"{content_hash}{suffix}" for suffix in (".csv", ".parquet")))
+
+
+def prune_cache(keep=None, max_bytes=None):
+    filecache.prune(CACHE_DIR, CACHE_MAX_BYTES if max_bytes is None else max_bytes, keep)
+
+
+def downcast_chunk(chunk, category_cols):
+    # Smallest lossless numeric dtypes; low-cardinality strings as categoricals
+    import pandas as pd
+    for col in chunk.columns:
+        series = chunk[col]
+        if pd.api.types.is_integer_dtype(series):
+            chunk[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            small = series.astype('float32')
+            if ((small == series) | series.isna()).all():
+                chunk[col] = small
+        elif col in category_cols:
+            chunk[col] = series.astype('category')
+    return chunk
+
+
+def concat_chunks(chunks):
+    import pandas as pd
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = {}
+    for col in chunks[0].columns:
+        parts = [c[col] for c in chunks]
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            try:
+                columns[col] = pd.Series(pd.api.types.union_categoricals(parts), name=col)
+                continue
+            except TypeError:
+                # Chunks inferred different category dtypes (e.g. ints and strings)
+                parts = [p.astype(object) for p in parts]
+        columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def read_csv_typed(path):
+    import pandas as pd
+    chunks = []
+    category_cols = None
+    for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS, low_memory=False):
+        if category_cols is None:
+            # Decide on the first chunk which string columns become categoricals
+            category_cols = {
+                col for col in chunk.columns
+                if not pd.api.types.is_numeric_dtype(chunk[col])
+                and chunk[col].nunique(dropna=True) <= CATEGORY_RATIO * max(len(chunk), 1)
+            }
+        chunks.append(downcast_chunk(chunk, category_cols))
+    if not chunks:
+        return pd.read_csv(path)
+    df = concat_chunks(chunks)
+    # Columns inferred as numeric in some chunks and text in others are re-read
+    # as text, as a single full read would have done
+    for col in df.columns:
+        if len({pd.api.types.is_numeric_dtype(c[col]) for c in chunks}) > 1:
+            text = pd.read_csv(path, usecols=[col], dtype=str)[col]
+            if text.nunique(dropna=True) <= CATEGORY_RATIO * max(len(text), 1):
+                text = text.astype('category')
+            df[col] = text
+    return df.reset_index(drop=True)
+
+
+def load_csv(content_hash, csv_path):
+    # Typed frame for a cached CSV; the Parquet copy survives restarts
+    import pandas as pd
+    parquet_path = CACHE_DIR / f"{content_hash}.parquet"
+    if HAS_PARQUET and parquet_path.exists():
+        return pd.read_parquet(parquet_path)
+    df = read_csv_typed(csv_path)
+    if HAS_PARQUET:
+        try:
+            df.to_parquet(parquet_path, index=False)
+            Path(csv_path).unlink(missing_ok=True)
+            prune_cache(keep=content_hash)
+        except Exception:
+            parquet_path.unlink(missing_ok=True)
+    return df
+
+
+# --- URL CACHE ---
+URL_FRESH_SECONDS = 300
+URL_TIMEOUT = 30
+# One lock for the URL index, shared by sessions and refresh threads
+URL_INDEX_LOCK = threading.Lock()
+
+
+def url_index_path():
+    return CACHE_DIR / "urls.json"
+
+
+def read_url_index():
+    try:
+        return json.loads(url_index_path().read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def update_url_index(url, entry):
+    with URL_INDEX_LOCK:
+        index = read_url_index()
+        index[url] = entry
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = url_index_path().with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(index), encoding="utf-8")
+        os.replace(tmp_path, url_index_path())
+
+
+def cached_content(entry):
+    # The CSV is removed once its Parquet copy exists; either one will do
+    return entry and (
+        Path(entry["path"]).exists() or (CACHE_DIR / f"{entry['hash']}.parquet").exists()
+    )
+
+
+def fetch_url(url, force=False, progress=None):
+    # Disk-cached download: fresh entries are reused without any request,
+    # stale ones are revalidated with ETag / Last-Modified
+    entry = read_url_index().get(url)
+    usable = cached_content(entry)
+    if usable and not force and time.time() - entry["checked"] < URL_FRESH_SECONDS:
+        return entry["hash"], Path(entry["path"])
+    request = urllib.request.Request(url)
+    if usable:
+        if entry.get("etag"):
+            request.add_header("If-None-Match", entry["etag"])
+        if entry.get("last_modified"):
+            request.add_header("If-Modified-Since", entry["last_modified"])
+    try:
+        with urllib.request.urlopen(request, timeout=URL_TIMEOUT) as response:
+            total = int(response.headers.get("Content-Length") or 0)
+            received = 0
+
+            def on_chunk(size):
+                nonlocal received
+                received += size
+                if progress:
+                    progress(received, total)
+
+            content_hash, path = spool_to_cache(response, on_chunk)
+            entry = {
+                "hash": content_hash,
+                "path": str(path),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or not usable:
+            raise
+    entry["checked"] = time.time()
+    update_url_index(url, entry)
+    return entry["hash"], Path(entry["path"])
+
+
+# --- OUT-OF-CORE ENGINE ---
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def engine_table(parquet_path):
+    return "read_parquet('" + str(parquet_path).replace("'", "''") + "')"
+
+
+def engine_query(sql, params=None):
+    import duckdb
+    with duckdb.connect() as con:
+        return con.execute(sql, params or []).df()
+
+
+def csv_to_parquet(content_hash, csv_path):
+    # DuckDB converts the CSV to Parquet itself, so it never has to fit in memory
+    import duckdb
+    parquet_path = CACHE_DIR / f"{content_hash}.parquet"
+    if not parquet_path.exists():
+        tmp_path = CACHE_DIR / f"{content_hash}.parquet.tmp"
+        target = str(tmp_path).replace("'", "''")
+        with duckdb.connect() as con:
+            con.execute(f"COPY (SELECT * FROM read_csv_auto(?)) TO '{target}' (FORMAT PARQUET)", [str(csv_path)])
+        os.replace(tmp_path, parquet_path)
+        prune_cache(keep=content_hash)
+    return engine_table(parquet_path)
+
+
+def sql_value(v):
+    return v.item() if hasattr(v, 'item') else v
+
+
+def compile_predicate(filters):
+    # All sidebar filters as one WHERE clause with bound parameters
+    clauses, params = [], []
+    for col, val in filters.items():
+        if isinstance(val, list):
+            clauses.append(f"{quote_ident(col)} IN ({', '.join('?' * len(val))})")
+            params.extend(sql_value(v) for v in val)
+        else:
+            clauses.append(f"{quote_ident(col)} BETWEEN ? AND ?")
+            params.extend([sql_value(val[0]), sql_value(val[1])])
+    return (" AND ".join(clauses) or "TRUE"), params
+
+
+def iter_result(result):
+    while True:
+        chunk = result.fetch_df_chunk()
+        if chunk.empty:
+            return
+        yield chunk
+
+
+def engine_export(table, where, params, filepath, export_format, progress=None, total=None):
+    # Export the full filtered result (not the sample) straight from DuckDB;
+    # COPY runs as a single statement, so only XML reports progress
+    import duckdb
+    query = f"SELECT * FROM {table} WHERE {where}"
+    with partial_file(filepath), duckdb.connect() as con:
+        if export_format == "XML":
+            result = con.execute(query, params)
+            write_export(iter_result(result), filepath, export_format, progress, total)
+        else:
+            target = str(filepath).replace("'", "''")
+            options = {
+                "CSV": "FORMAT CSV, HEADER",
+                "JSON": "FORMAT JSON, ARRAY true",
+                "NDJSON": "FORMAT JSON",
+                "Parquet": "FORMAT PARQUET",
+            }[export_format]
+            con.execute(f"COPY ({query}) TO '{target}' ({options})", params)
+
+
+# --- COLUMN PROFILES ---
+SLIDER_MIN_DISTINCT = 30
+MULTISELECT_MAX_DISTINCT = 1000
+TOP_VALUES = 10
+LOOKUP_LIMIT = 50
+
+
+def profile_entry(numeric, n_distinct, min_val, max_val, top, values):
+    # Widget choice: slider for wide numeric ranges, a multiselect when all
+    # values fit, otherwise a searchable lookup
+    if numeric and n_distinct >= SLIDER_MIN_DISTINCT:
+        widget = 'slider'
+    elif n_distinct <= MULTISELECT_MAX_DISTINCT:
+        widget = 'multiselect'
+    else:
+        widget = 'lookup'
+    return {
+        'widget': widget,
+        'n_distinct': int(n_distinct),
+        'min': float(min_val) if widget == 'slider' else None,
+        'max': float(max_val) if widget == 'slider' else None,
+        'top': top,
+        'values': values() if widget == 'multiselect' else None,
+    }
+
+
+def profile_columns(df):
+    import pandas as pd
+    profiles = {}
+    for col in df.columns:
+        series = df[col]
+        numeric = pd.api.types.is_numeric_dtype(series)
+        n_distinct = series.nunique(dropna=True)
+        top = series.value_counts().head(TOP_VALUES).index.tolist()
+        profiles[col] = profile_entry(
+            numeric, n_distinct,
+            series.min() if numeric else None, series.max() if numeric else None,
+            top, lambda: series.dropna().unique().tolist()
+        )
+    return profiles
+
+
+# --- FILTERS ---
+def column_mask(df, col, values=None, bounds=None):
+    # Boolean mask for one sidebar filter: a value list or (low, high) bounds
+    import numpy as np
+    import pandas as pd
+    series = df[col]
+    if bounds is not None:
+        arr = series.to_numpy()
+        return (arr >= bounds[0]) & (arr <= bounds[1])
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.categories.get_indexer(list(values))
+        return np.isin(series.cat.codes.to_numpy(), codes[codes >= 0])
+    return series.isin(values).to_numpy()
+
+
+def apply_filters(df, filters, mask_fn=None):
+    # Combine all filter masks into one and slice the frame once; mask_fn
+    # lets the app substitute its cached masks
+    mask_fn = mask_fn or (lambda col, values, bounds: column_mask(df, col, values, bounds))
+    mask = None
+    for col, val in filters.items():
+        if isinstance(val, list):
+            m = mask_fn(col, tuple(val), None)
+        else:
+            m = mask_fn(col, None, (val[0], val[1]))
+        if mask is None:
+            mask = m.copy()
+        else:
+            mask &= m
+    return df if mask is None else df[mask]
+
+
+def restore_filter_values(values, options, dtype):
+    # Saved filters are JSON, so dates and numpy scalars come back as strings:
+    # map them onto the widget options by their text and convert the rest to
+    # the column's dtype
+    import pandas as pd
+    by_text = {str(v): v for v in options}
+    restored = []
+    for v in values:
+        if str(v) in by_text:
+            restored.append(by_text[str(v)])
+            continue
+        try:
+            restored.append(pd.Series([v]).astype(dtype).iloc[0])
+        except (TypeError, ValueError):
+            restored.append(v)
+    return restored
+
+
+# --- CHART DATA ---
+def axis_values(series):
+    # Numeric representation of an axis for downsampling (positions for text)
+    import numpy as np
+    import pandas as pd
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy().astype('datetime64[ns]').astype('int64').astype(float)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=float)
+    return np.arange(len(series), dtype=float)
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the points that shape the line
+    import numpy as np
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def line_data(df, x, y, budget):
+    import numpy as np
+    import pandas as pd
+    data = df[[x, y]].dropna() if x != y else df[[x]].dropna()
+    if pd.api.types.is_numeric_dtype(data[x]) or pd.api.types.is_datetime64_any_dtype(data[x]):
+        data = data.sort_values(x, kind='stable')
+    if len(data) <= budget:
+        return data
+    if pd.api.types.is_numeric_dtype(data[y]):
+        idx = lttb_indices(axis_values(data[x]), data[y].to_numpy(dtype=float), budget)
+    else:
+        idx = np.linspace(0, len(data) - 1, budget).astype(np.int64)
+    return data.iloc[idx]
+
+
+def category_data(df, x, y, budget, engine=None):
+    # Sum of y per x (count for non-numeric y), largest `budget` groups
+    import pandas as pd
+    label = y if y != x else f"{y} (totaal)"
+    if engine is not None:
+        table, where, params, numeric = engine
+        cx, cy = quote_ident(x), quote_ident(y)
+        agg = f"sum({cy})" if numeric else f"count({cy})"
+        return engine_query(
+            f"SELECT {cx} AS x, {agg} AS y FROM {table} WHERE {where} GROUP BY {cx} ORDER BY 2 DESC LIMIT {int(budget)}",
+            params
+        ).rename(columns={'x': x, 'y': label})
+    grouped = df.groupby(x, observed=True)[y]
+    agg = grouped.sum() if pd.api.types.is_numeric_dtype(df[y]) else grouped.count()
+    agg = agg.nlargest(budget) if len(agg) > budget else agg
+    return pd.DataFrame({x: agg.index, label: agg.to_numpy()})
+
+
+# --- EXPORT ---
+EXPORT_CHUNK_ROWS = 100_000
+EXPORT_FORMATS = ["CSV", "JSON", "NDJSON", "XML"] + (["Parquet"] if HAS_PARQUET else [])
+EXPORT_EXTENSIONS = {"CSV": "csv", "JSON": "json", "NDJSON": "ndjson", "XML": "xml", "Parquet": "parquet"}
+
+
+@contextmanager
+def partial_file(filepath):
+    # A failed or cancelled export removes what it wrote so far, also when
+    # no session waits for it any more (a new export replaced it)
+    try:
+        yield
+    except BaseException:
+        Path(filepath).unlink(missing_ok=True)
+        raise
+
+
+def frame_export(df, filepath, export_format, progress=None):
+    # The Parquet schema comes from the whole frame: a column that is all
+    # nulls in the first chunk would otherwise get the null type
+    schema = None
+    if export_format == "Parquet":
+        import pyarrow
+        schema = pyarrow.Schema.from_pandas(df, preserve_index=False)
+    with partial_file(filepath):
+        write_export(frame_chunks(df), filepath, export_format, progress, len(df), schema)
+
+
+def frame_chunks(df):
+    # An empty frame still yields one (empty) chunk, so the writers know its columns
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+
+def xml_records(chunk):
+    # All <record> elements of a chunk, built column-wise instead of per row
+    import pandas as pd
+    records = pd.Series("  <record>\n", index=chunk.index, dtype=object)
+    for col in chunk.columns:
+        text = chunk[col].astype(object).map(str)
+        for char, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;")):
+            text = text.str.replace(char, entity, regex=False)
+        records += (f"    <{col}>" + text + f"</{col}>\n").where(text != "", f"    <{col}/>\n")
+    return "".join(records + "  </record>\n")
+
+
+def write_export(chunks, filepath, export_format, progress=None, total=None, schema=None):
+    # Stream chunks to disk so memory stays bounded by one chunk; progress is
+    # reported per chunk, as a fraction of `total` rows when it is known
+    written = 0
+
+    def report(chunk):
+        nonlocal written
+        written += len(chunk)
+        if progress:
+            progress(written / total if total else 0.0, f"{written:,} rijen")
+
+    if export_format == "Parquet":
+        import pyarrow
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            # Empty chunks are written too: the writer (and so the file) is
+            # created from `schema`, or the first chunk's, even without rows
+            for chunk in chunks:
+                batch = pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(filepath, batch.schema)
+                writer.write_table(batch.cast(writer.schema))
+                report(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            pq.write_table(pyarrow.table({}), filepath)
+        return
+    with open(filepath, "w", encoding="utf-8", newline="") as f:
+        if export_format == "JSON":
+            f.write("[")
+        elif export_format == "XML":
+            f.write('<?xml version="1.0" ?>\n')
+        first = True
+        last = None
+        for chunk in chunks:
+            last = chunk
+            if chunk.empty:
+                continue
+            if export_format == "XML" and first:
+                f.write("<data>\n")
+            if export_format == "CSV":
+                chunk.to_csv(f, index=False, header=first, lineterminator="\n")
+            elif export_format == "JSON":
+                f.write(("" if first else ",") + chunk.to_json(orient="records")[1:-1])
+            elif export_format == "NDJSON":
+                f.write(chunk.to_json(orient="records", lines=True).rstrip("\n") + "\n")
+            elif export_format == "XML":
+                f.write(xml_records(chunk))
+            first = False
+            report(chunk)
+        if export_format == "CSV" and first and last is not None:
+            # No rows: still write the header, as DataFrame.to_csv does
+            last.to_csv(f, index=False, lineterminator="\n")
+        elif export_format == "JSON":
+            f.write("]")
+        elif export_format == "XML":
+            f.write("<data/>\n" if first else "</data>\n")
@@ -0,0 +1,72 @@
+# Content-addressed files on local disk, for the dashboard's dataset cache and
+# the Ingest Optimizer's uploads: each file is named after the SHA-256 of its
+# content and directories are pruned least recently used first (by mtime).
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+STALE_TMP_SECONDS = 3600
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def spool(stream, directory, suffix, max_bytes, on_chunk=None):
+    # Stream a source to `<sha256><suffix>` in `directory`, then prune the
+    # directory to max_bytes without evicting the new file
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=suffix, delete=False) as tmp:
+        for chunk in iter(lambda: stream.read(1 << 20), b""):
+            digest.update(chunk)
+            tmp.write(chunk)
+            size += len(chunk)
+            if on_chunk:
+                on_chunk(len(chunk))
+    content_hash = digest.hexdigest()
+    path = directory / f"{content_hash}{suffix}"
+    os.replace(tmp.name, path)
+    prune(directory, max_bytes, keep=content_hash)
+    return content_hash, path, size
+
+
+def touch(*paths):
+    # Mark files as recently used, so prune evicts them last
+    for path in paths:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+
+def prune(directory, max_bytes, keep=None):
+    # Evict the least recently used files until the directory fits in
+    # max_bytes; files of the content hash `keep` are never evicted.
+    # Leftovers of interrupted writes are removed once they are stale, other
+    # files (such as an index) are left alone.
+    now = time.time()
+    total = 0
+    candidates = []
+    for path in directory.glob("*"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if not path.is_file():
+            continue
+        if path.suffix == ".tmp" or path.name.startswith("tmp"):
+            if now - stat.st_mtime > STALE_TMP_SECONDS:
+                path.unlink(missing_ok=True)
+            continue
+        content_hash = path.name.split(".")[0]
+        if not CONTENT_HASH.fullmatch(content_hash):
+            continue
+        total += stat.st_size
+        if content_hash != keep:
+            candidates.append((stat.st_mtime, stat.st_size, path))
+    for _, size, path in sorted(candidates):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
@@ -1,53 +1,300 @@
 
 from datetime import datetime
-import pandas as pd
 import json
-import xml.etree.ElementTree as ET
-import os
-import plotly.express as px
+import threading
+from collections import OrderedDict
 import streamlit as st
-from io import StringIO
+from streamlit import runtime
+import instrumentation
+import jobs
 from pathlib import Path
-from xml.dom import minidom
+from dashboard_core import (
+    HAS_DUCKDB, LOOKUP_LIMIT, TOP_VALUES, EXPORT_FORMATS,
+    EXPORT_EXTENSIONS, spool_to_cache, load_csv, quote_ident, engine_query,
+    csv_to_parquet, compile_predicate, engine_export, profile_entry,
+    profile_columns, column_mask, apply_filters, restore_filter_values,
+    line_data, category_data, frame_export, touch_cache, fetch_url,
+)
 
 # App title
 st.set_page_config(page_title="Flexibel Dashboard", layout="wide")
 st.title("📊 Flexibel Data Dashboard")
+prof = instrumentation.begin("dashboard")
 
 # Create default download directory
 DOWNLOAD_DIR = Path.home() / "Downloads"
 
+# --- INGESTION ---
+@instrumentation.cached("load_dataset", st.cache_resource(max_entries=4, show_spinner="Dataset inlezen..."))
+def load_dataset(content_hash, csv_path):
+    # Shared per content hash across reruns
+    return load_csv(content_hash, csv_path)
+
+
+def uploaded_source(uploaded_file):
+    # Hash each upload once per session, keyed on the uploader's file id
+    cached = st.session_state.get('upload_source')
+    if not cached or cached[0] != uploaded_file.file_id:
+        uploaded_file.seek(0)
+        content_hash, path = spool_to_cache(uploaded_file)
+        cached = (uploaded_file.file_id, content_hash, path)
+        st.session_state['upload_source'] = cached
+    return cached[1], cached[2]
+
+
+# --- URL CACHE ---
+URL_REFRESH_SECONDS = 60
+
+
+@st.cache_resource
+def url_refreshers():
+    # url -> {'stop': Event, 'sessions': ids of the sessions that want it}
+    return {'refreshers': {}, 'lock': threading.Lock()}
+
+
+def session_alive(session):
+    return not runtime.exists() or runtime.get_instance().is_active_session(session)
+
+
+def release_refresher(reg, url, session):
+    refresher = reg['refreshers'].get(url)
+    if refresher is None:
+        return
+    refresher['sessions'].discard(session)
+    if not refresher['sessions']:
+        refresher['stop'].set()
+        del reg['refreshers'][url]
+
+
+def background_refresh(url, enabled):
+    # Daemon thread per URL that revalidates it while at least one live
+    # session has background refresh on; the next rerun picks up changes
+    reg = url_refreshers()
+    session = jobs.session_id()
+    previous = st.session_state.get('refresh_url')
+    with reg['lock']:
+        if previous is not None and (previous != url or not enabled):
+            release_refresher(reg, previous, session)
+        if enabled:
+            refresher = reg['refreshers'].get(url)
+            if refresher is None:
+                refresher = {'stop': threading.Event(), 'sessions': set()}
+                reg['refreshers'][url] = refresher
+
+                def loop(refresher=refresher):
+                    while not refresher['stop'].wait(URL_REFRESH_SECONDS):
+                        with reg['lock']:
+                            # Sessions that went away without unticking
+                            for gone in [s for s in refresher['sessions'] if not session_alive(s)]:
+                                release_refresher(reg, url, gone)
+                        if refresher['stop'].is_set():
+                            return
+                        try:
+                            fetch_url(url, force=True)
+                        except Exception:
+                            pass
+
+                threading.Thread(target=loop, daemon=True).start()
+            refresher['sessions'].add(session)
+    st.session_state['refresh_url'] = url if enabled else None
+
+
+def download_url(url, force=False):
+    bar = st.sidebar.progress(0.0, text="Dataset downloaden...")
+
+    def progress(received, total):
+        if total:
+            bar.progress(min(received / total, 1.0), text=f"Dataset downloaden... {received / 1e6:.1f} / {total / 1e6:.1f} MB")
+        else:
+            bar.progress(0.0, text=f"Dataset downloaden... {received / 1e6:.1f} MB")
+
+    try:
+        return fetch_url(url, force=force, progress=progress)
+    finally:
+        bar.empty()
+
+
+# --- OUT-OF-CORE ENGINE ---
+ENGINE_ROW_LIMIT = 200_000
+
+
+@instrumentation.cached("engine_dataset", st.cache_resource(max_entries=4, show_spinner="Parquet-bestand aanmaken..."))
+def engine_dataset(content_hash, csv_path):
+    return csv_to_parquet(content_hash, csv_path)
+
+
+# --- COLUMN PROFILES ---
+@instrumentation.cached("profile_frame", st.cache_data(max_entries=8, show_spinner="Kolommen profileren..."))
+def profile_frame(content_hash, _df):
+    return profile_columns(_df)
+
+
+@instrumentation.cached("profile_engine", st.cache_data(max_entries=8, show_spinner="Kolommen profileren..."))
+def profile_engine(table, numeric_cols):
+    # One scan for the distinct counts and ranges of all columns; per column
+    # only a ranked value query, and none for slider columns
+    columns = engine_query(f"SELECT * FROM {table} LIMIT 0").columns
+    aggregates = []
+    for i, col in enumerate(columns):
+        c = quote_ident(col)
+        aggregates.append(f"approx_count_distinct({c}) AS n_{i}")
+        if col in numeric_cols:
+            aggregates += [f"min({c}) AS lo_{i}", f"max({c}) AS hi_{i}"]
+    stats = engine_query(f"SELECT {', '.join(aggregates)} FROM {table}").iloc[0]
+
+    def ranked(c, limit=None):
+        # Non-null values, most frequent first
+        return engine_query(
+            f"SELECT {c} AS v FROM {table} WHERE {c} IS NOT NULL GROUP BY {c} ORDER BY count(*) DESC"
+            + (f" LIMIT {limit}" if limit else "")
+        )['v'].tolist()
+
+    profiles = {}
+    for i, col in enumerate(columns):
+        c = quote_ident(col)
+        profile = profile_entry(
+            col in numeric_cols, stats[f"n_{i}"], stats.get(f"lo_{i}"), stats.get(f"hi_{i}"), [],
+            lambda c=c: ranked(c)
+        )
+        if profile['widget'] == 'multiselect':
+            profile['top'] = profile['values'][:TOP_VALUES]
+        elif profile['widget'] == 'lookup':
+            profile['top'] = ranked(c, TOP_VALUES)
+        profiles[col] = profile
+    return profiles
+
+
+@instrumentation.cached("lookup_values", st.cache_data(max_entries=512, show_spinner=False))
+def lookup_values(content_hash, table, col, query, _df):
+    # Server-side search for high-cardinality columns; returns at most LOOKUP_LIMIT values
+    if table is not None:
+        c = quote_ident(col)
+        return engine_query(
+            f"SELECT DISTINCT {c} AS v FROM {table} WHERE CAST({c} AS VARCHAR) ILIKE ? LIMIT {LOOKUP_LIMIT}",
+            [f"%{query}%"]
+        )['v'].tolist()
+    series = _df[col].dropna()
+    matches = series[series.astype(str).str.contains(query, case=False, regex=False)]
+    return matches.drop_duplicates().head(LOOKUP_LIMIT).tolist()
+
+
+# --- FILTER MASKS ---
+# Masks are one byte per row, so the shared cache is capped by size rather
+# than by a number of entries; the least recently used masks go first
+MASK_CACHE_BYTES = 256 * 1024 * 1024
+
+
+@st.cache_resource
+def mask_cache():
+    return {'masks': OrderedDict(), 'bytes': 0, 'lock': threading.Lock()}
+
+
+def filter_mask(content_hash, col, values, bounds, df):
+    # Cached per filter so that changing one filter only recomputes that mask
+    cache = mask_cache()
+    key = (content_hash, col, values, bounds)
+    with cache['lock']:
+        mask = cache['masks'].get(key)
+        if mask is not None:
+            cache['masks'].move_to_end(key)
+    recorder = instrumentation.current()
+    if recorder is not None:
+        recorder.cache_event("filter_mask", hit=mask is not None)
+    if mask is None:
+        mask = column_mask(df, col, values, bounds)
+        with cache['lock']:
+            if key not in cache['masks']:
+                cache['masks'][key] = mask
+                cache['bytes'] += mask.nbytes
+            while cache['bytes'] > MASK_CACHE_BYTES and len(cache['masks']) > 1:
+                _, evicted = cache['masks'].popitem(last=False)
+                cache['bytes'] -= evicted.nbytes
+    return mask
+
+
+# --- CHART DATA ---
+HEATMAP_BINS = 60
+
+
+def heatmap_figure(df, x, y):
+    # 2D histogram binned server-side; only the bin counts go to the browser
+    import numpy as np
+    import plotly.express as px
+    data = df[[x, y]].dropna() if x != y else df[[x]].dropna()
+    counts, x_edges, y_edges = np.histogram2d(
+        data[x].to_numpy(dtype=float), data[y].to_numpy(dtype=float), bins=HEATMAP_BINS
+    )
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    fig = px.imshow(
+        counts.T, x=x_centers, y=y_centers, origin='lower', aspect='auto',
+        labels={'x': x, 'y': y, 'color': 'count'}
+    )
+    return fig
+
+
 # --- FILE LOADER ---
 st.sidebar.header("📁 Data inladen")
 upload_option = st.sidebar.radio("Kies gegevensbron:", ["Upload CSV", "Laad via URL"])
 
-df = None
+use_engine = HAS_DUCKDB and st.sidebar.checkbox(
+    "Out-of-core engine (DuckDB)",
+    help="Filtert direct op een Parquet-kopie op schijf; alleen het (gesamplede) resultaat wordt in het geheugen geladen."
+)
+
+source = None
 if upload_option == "Upload CSV":
+    background_refresh(None, False)
     uploaded_file = st.sidebar.file_uploader("Upload een CSV-bestand", type="csv")
     if uploaded_file:
-        df = pd.read_csv(uploaded_file)
+        source = uploaded_source(uploaded_file)
 elif upload_option == "Laad via URL":
     url = st.sidebar.text_input("Voer een geldige CSV-URL in")
+    refresh = st.sidebar.button("🔄 Opnieuw controleren", disabled=not url)
+    auto_refresh = st.sidebar.checkbox(
+        "Op de achtergrond verversen",
+        help=f"Controleert de URL elke {URL_REFRESH_SECONDS} seconden op een nieuwe versie."
+    )
+    background_refresh(url or None, auto_refresh and bool(url))
     if url:
         try:
-            df = pd.read_csv(url)
+            source = download_url(url, force=refresh)
         except Exception as e:
             st.sidebar.error(f"Fout bij laden van URL: {e}")
 
+prof.mark("parse")
+df = None
+table = None
+if source is not None:
+    touch_cache(source[0])
+    try:
+        if use_engine:
+            table = engine_dataset(*source)
+            df = engine_query(f"SELECT * FROM {table} LIMIT 5")
+        else:
+            df = load_dataset(*source)
+    except Exception as e:
+        st.sidebar.error(f"Fout bij inlezen van data: {e}")
+
 # --- MAIN DASHBOARD ---
 if df is not None:
     st.success("✅ Data succesvol geladen!")
     st.subheader("📌 Voorbeelddata")
     st.dataframe(df.head())
 
+    # In engine mode df only holds the preview rows; it still carries the schema
     numeric_cols = df.select_dtypes(include='number').columns.tolist()
-    categorical_cols = df.select_dtypes(include='object').columns.tolist()
+    categorical_cols = df.select_dtypes(exclude='number').columns.tolist()
 
     # FILTER OPSLAAN / LADEN
     st.sidebar.header("💾 Filters opslaan / laden")
     filter_name = st.sidebar.text_input("Naam voor filterinstelling")
     filter_file = st.sidebar.file_uploader("Laad filterbestand", type="json")
     loaded_filters = {}
+    # Keyed multiselects ignore a changed default, so a newly loaded filter
+    # file is written into their state once, before they are created
+    new_filter_file = filter_file is not None and st.session_state.get('filter_file_id') != filter_file.file_id
+    st.session_state['filter_file_id'] = filter_file.file_id if filter_file else None
 
     if filter_file:
         try:
@@ -63,20 +310,37 @@ if df is not None:
             loaded_filters = {}
 
     # FILTERS
+    prof.mark("stats")
     st.sidebar.header("🔍 Filters")
     filters = {}
-    for col in df.columns:
-        unique_vals = df[col].dropna().unique()
-        if df[col].dtype == 'object' or len(unique_vals) < 30:
-            default = loaded_filters.get(col, [])
-            selection = st.sidebar.multiselect(f"{col}", unique_vals, default=default)
-            if selection:
-                filters[col] = selection
-        else:
-            min_val, max_val = float(df[col].min()), float(df[col].max())
+    profiles = profile_engine(table, tuple(numeric_cols)) if use_engine else profile_frame(source[0], df)
+    for col, profile in profiles.items():
+        if profile['widget'] == 'slider':
+            min_val, max_val = profile['min'], profile['max']
             default_range = loaded_filters.get(col, [min_val, max_val])
             range_val = st.sidebar.slider(f"{col}", min_val, max_val, tuple(default_range))
-            filters[col] = range_val
+            # A slider at its full range filters nothing; leaving it out keeps
+            # the unfiltered path free of masks and copies
+            if range_val != (min_val, max_val):
+                filters[col] = range_val
+            continue
+        if new_filter_file and col in loaded_filters:
+            known = profile['values'] if profile['widget'] == 'multiselect' else profile['top']
+            st.session_state[f"filter_{col}"] = restore_filter_values(loaded_filters[col], known, df[col].dtype)
+        if profile['widget'] == 'multiselect':
+            options = profile['values']
+        else:
+            query = st.sidebar.text_input(
+                f"Zoek in {col}", key=f"lookup_{col}",
+                help=f"{profile['n_distinct']:,} unieke waarden (schatting). Meest voorkomend: "
+                     + ", ".join(str(v) for v in profile['top'][:5])
+            )
+            matches = lookup_values(source[0], table, col, query, df) if query else profile['top']
+            selected = st.session_state.get(f"filter_{col}", [])
+            options = list(dict.fromkeys(list(selected) + list(matches)))
+        selection = st.sidebar.multiselect(f"{col}", options, key=f"filter_{col}")
+        if selection:
+            filters[col] = selection
 
     if st.sidebar.button("Filterinstelling opslaan"):
         if filter_name:
@@ -84,73 +348,105 @@ if df is not None:
             filename = f"{filter_name}_{timestamp}.json"
             filepath = DOWNLOAD_DIR / filename
             with open(filepath, "w") as f:
-                json.dump(filters, f)
+                # Dates (Timestamps) and numpy scalars are saved as text
+                json.dump(filters, f, default=str)
             st.sidebar.success(f"Opgeslagen als: {filepath}")
 
     # Pas filters toe
-    df_filtered = df.copy()
-    for col, val in filters.items():
-        if isinstance(val, list):
-            df_filtered = df_filtered[df_filtered[col].isin(val)]
+    prof.mark("filter")
+    if use_engine:
+        where, params = compile_predicate(filters)
+        n_rows = int(engine_query(f"SELECT count(*) AS n FROM {table} WHERE {where}", params)['n'].iloc[0])
+        if n_rows > ENGINE_ROW_LIMIT:
+            df_filtered = engine_query(
+                f"SELECT * FROM (SELECT * FROM {table} WHERE {where}) "
+                f"USING SAMPLE reservoir({ENGINE_ROW_LIMIT} ROWS) REPEATABLE (42)",
+                params
+            )
+            st.caption(f"{n_rows:,} rijen na filteren; een steekproef van {ENGINE_ROW_LIMIT:,} rijen wordt getoond.")
         else:
-            df_filtered = df_filtered[df_filtered[col].between(val[0], val[1])]
+            df_filtered = engine_query(f"SELECT * FROM {table} WHERE {where}", params)
+    else:
+        df_filtered = apply_filters(
+            df, filters, lambda col, values, bounds: filter_mask(source[0], col, values, bounds, df)
+        )
 
+    prof.mark("render")
+    # plotly.express pas laden zodra er grafieken getoond worden
+    import plotly.express as px
     st.subheader("📊 Visualisatie")
     chart_type = st.selectbox("Kies grafiektype", ["Tabel", "Lijngrafiek", "Staafgrafiek", "Cirkeldiagram", "Scatterplot", "Heatmap"])
     x_axis = st.selectbox("X-as", df_filtered.columns)
     y_axis = st.selectbox("Y-as", df_filtered.columns)
+    point_budget = st.number_input("Max. punten per grafiek", min_value=500, max_value=200_000, value=5_000, step=500)
+    engine_agg = (table, where, params, y_axis in numeric_cols) if use_engine else None
 
     if chart_type == "Tabel":
         st.dataframe(df_filtered)
     elif chart_type == "Lijngrafiek":
-        fig = px.line(df_filtered, x=x_axis, y=y_axis)
+        plot_df = line_data(df_filtered, x_axis, y_axis, point_budget)
+        fig = px.line(plot_df, x=x_axis, y=y_axis, render_mode='webgl')
         st.plotly_chart(fig, use_container_width=True)
+        if len(df_filtered) > point_budget:
+            st.caption(f"Gedownsampled (LTTB) naar {len(plot_df):,} van {len(df_filtered):,} punten.")
     elif chart_type == "Staafgrafiek":
-        fig = px.bar(df_filtered, x=x_axis, y=y_axis)
+        plot_df = category_data(df_filtered, x_axis, y_axis, point_budget, engine_agg)
+        fig = px.bar(plot_df, x=x_axis, y=plot_df.columns[1])
         st.plotly_chart(fig, use_container_width=True)
     elif chart_type == "Cirkeldiagram":
-        fig = px.pie(df_filtered, names=x_axis, values=y_axis)
+        plot_df = category_data(df_filtered, x_axis, y_axis, point_budget, engine_agg)
+        fig = px.pie(plot_df, names=x_axis, values=plot_df.columns[1])
         st.plotly_chart(fig, use_container_width=True)
     elif chart_type == "Scatterplot":
-        fig = px.scatter(df_filtered, x=x_axis, y=y_axis)
+        plot_df = df_filtered
+        if len(plot_df) > point_budget:
+            plot_df = plot_df.sample(int(point_budget), random_state=42)
+            st.caption(f"Steekproef van {len(plot_df):,} van {len(df_filtered):,} punten.")
+        fig = px.scatter(plot_df, x=x_axis, y=y_axis, render_mode='webgl')
         st.plotly_chart(fig, use_container_width=True)
     elif chart_type == "Heatmap":
         if x_axis in numeric_cols and y_axis in numeric_cols:
-            fig = px.density_heatmap(df_filtered, x=x_axis, y=y_axis)
+            fig = heatmap_figure(df_filtered, x_axis, y_axis)
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.warning("Voor een heatmap moeten zowel X als Y numeriek zijn.")
 
     # EXPORT
+    prof.mark("export")
     st.subheader("📤 Exporteren van data")
-    export_format = st.selectbox("Kies exportformaat", ["CSV", "JSON", "XML"])
+    export_format = st.selectbox("Kies exportformaat", EXPORT_FORMATS)
     export_name = st.text_input("Bestandsnaam zonder extensie")
 
     if st.button("Exporteer"):
         if export_name:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{export_name}_{timestamp}.{export_format.lower()}"
+            filename = f"{export_name}_{timestamp}.{EXPORT_EXTENSIONS[export_format]}"
             filepath = DOWNLOAD_DIR / filename
 
-            if export_format == "CSV":
-                csv_data = df_filtered.to_csv(index=False)
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(csv_data)
-            elif export_format == "JSON":
-                json_data = df_filtered.to_json(orient="records")
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(json_data)
-            elif export_format == "XML":
-                root = ET.Element("data")
-                for _, row in df_filtered.iterrows():
-                    item = ET.SubElement(root, "record")
-                    for col in df_filtered.columns:
-                        child = ET.SubElement(item, col)
-                        child.text = str(row[col])
-                xml_str = minidom.parseString(ET.tostring(root)).toprettyxml(indent="  ")
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(xml_str)
-
-            st.success(f"✅ Bestand opgeslagen in: {filepath}")
+            # De export draait op de gedeelde job-pool met voortgang; bij een
+            # rerun wordt de lopende export weer opgepakt. Een DuckDB COPY is
+            # één statement zonder voortgang en kan dus niet worden afgebroken.
+            if use_engine:
+                jobs.submit('export', str(filepath), engine_export, table, where, params, filepath, export_format, total=n_rows)
+            else:
+                jobs.submit('export', str(filepath), frame_export, df_filtered, filepath, export_format)
+            st.session_state['export_cancellable'] = not use_engine or export_format == "XML"
+
+    export_job = jobs.current('export')
+    if export_job is not None:
+        cancellable = st.session_state.get('export_cancellable', True)
+        if not cancellable and not export_job.done():
+            st.caption("Deze export draait in DuckDB en kan niet worden geannuleerd.")
+        try:
+            jobs.wait(export_job, "Exporteren...", cancellable=cancellable)
+            st.success(f"✅ Bestand opgeslagen in: {export_job.key}")
+        except jobs.JobCancelled:
+            st.warning("Export geannuleerd.")
+        except Exception as e:
+            st.error(f"Export mislukt: {e}")
+        finally:
+            jobs.release('export')
 else:
     st.info("📂 Upload een dataset of geef een URL op om te beginnen.")
+
+prof.finish()
@@ -0,0 +1,149 @@
+# Parsing, path index and pruning for the Ingest Optimizer. XML paths are
+# interned in a trie, so pruning compares node ids instead of path strings.
+import json
+from collections import deque
+from copy import deepcopy
+from xml.etree import ElementTree as ET
+
+
+def intern_paths(root):
+    # Path trie over interned (namespace id, local name) segments; the
+    # Clark-notation path string and display label are built once per
+    # distinct path instead of once per element.
+    ns_ids = {}       # namespace URI -> id
+    seg_ids = {}      # Clark tag -> segment id
+    segments = []     # segment id -> (namespace id, local name)
+    children = []     # node id -> {segment id: child node id}
+    paths = []        # node id -> Clark path
+    labels = []       # node id -> display label without namespaces
+    items = []        # node id -> elements at this path
+
+    def segment(tag):
+        sid = seg_ids.get(tag)
+        if sid is None:
+            if tag.startswith('{'):
+                uri, local = tag[1:].split('}', 1)
+            else:
+                uri, local = '', tag
+            sid = seg_ids[tag] = len(segments)
+            segments.append((ns_ids.setdefault(uri, len(ns_ids)), local))
+        return sid
+
+    def add_node(path, label):
+        children.append({})
+        paths.append(path)
+        labels.append(label)
+        items.append([])
+        return len(paths) - 1
+
+    segment(root.tag)
+    add_node(root.tag, segments[0][1])
+    items[0].append(root)
+    queue = deque([(root, 0)])
+    while queue:
+        elem, node = queue.popleft()
+        kids = children[node]
+        for c in elem:
+            sid = segment(c.tag)
+            child = kids.get(sid)
+            if child is None:
+                local = segments[sid][1]
+                if node == 0:
+                    child = add_node(c.tag, local)
+                else:
+                    child = add_node(f"{paths[node]}/{c.tag}", f"{labels[node]}/{local}")
+                kids[sid] = child
+            items[child].append(c)
+            queue.append((c, child))
+    return seg_ids, children, paths, labels, items
+
+
+def collect_keys(obj, path="", keys=None):
+    # Path -> every value found at that path; list items add to the same
+    # paths, like intern_paths collects all elements per XML path
+    if keys is None:
+        keys = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            full = f"{path}/{k}" if path else k
+            keys.setdefault(full, []).append(v)
+            collect_keys(v, full, keys)
+    elif isinstance(obj, list):
+        for item in obj:
+            collect_keys(item, path, keys)
+    return keys
+
+
+def build_index(spool_path, suffix):
+    # Parsed document and path index
+    if suffix == '.xml':
+        root = ET.parse(spool_path).getroot()
+        seg_ids, path_children, node_paths, node_labels, node_items = intern_paths(root)
+        tags_map = {path: node_items[n] for n, path in enumerate(node_paths)}
+        path_labels = {path: node_labels[n] for n, path in enumerate(node_paths)}
+        str_counts = {path: sum(1 for elem in elems if elem.text and elem.text.strip()) for path, elems in tags_map.items()}
+        return {
+            'format': 'xml', 'root': root, 'tags_map': tags_map, 'path_labels': path_labels,
+            'str_counts': str_counts, 'seg_ids': seg_ids, 'path_children': path_children,
+            'node_paths': node_paths, 'node_items': node_items,
+        }
+    with open(spool_path, 'rb') as f:
+        data = json.load(f)
+    tags_map = collect_keys(data)
+    str_counts = {path: sum(1 for v in values if isinstance(v, str)) for path, values in tags_map.items()}
+    return {'format': 'json', 'data': data, 'tags_map': tags_map, 'path_labels': {}, 'str_counts': str_counts}
+
+
+def path_nodes(index, selected):
+    selected = set(selected)
+    return {n for n, path in enumerate(index['node_paths']) if path in selected}
+
+
+def prune_xml(index, elem, node, excluded):
+    # Remove the subtrees whose trie node is in `excluded`
+    path_children = index['path_children']
+    seg_ids = index['seg_ids']
+    kids = path_children[node]
+    for c in list(elem):
+        child_node = kids[seg_ids[c.tag]]
+        if child_node in excluded:
+            elem.remove(c)
+        else:
+            prune_xml(index, c, child_node, excluded)
+
+
+def prune_json(o, excluded, p=""):
+    if isinstance(o, dict):
+        for k in list(o.keys()):
+            full = f"{p}/{k}" if p else k
+            if full in excluded:
+                del o[k]
+            else:
+                prune_json(o[k], excluded, full)
+    elif isinstance(o, list):
+        for i in o:
+            prune_json(i, excluded, p)
+
+
+def pruned_copy(index, excluded, progress=None):
+    # Deep copy of the document without the excluded paths
+    if index['format'] == 'xml':
+        root = deepcopy(index['root'])
+        if progress:
+            progress(0.4, "kopie gemaakt")
+        prune_xml(index, root, 0, path_nodes(index, excluded))
+    else:
+        root = deepcopy(index['data'])
+        if progress:
+            progress(0.4, "kopie gemaakt")
+        prune_json(root, set(excluded))
+    if progress:
+        progress(0.7, "gefilterd")
+    return root
+
+
+def export_bytes(index, excluded, progress=None):
+    pruned = pruned_copy(index, excluded, progress)
+    if index['format'] == 'xml':
+        return ET.tostring(pruned, encoding='utf-8', xml_declaration=True)
+    return json.dumps(pruned, indent=2).encode('utf-8')
@@ -0,0 +1,198 @@
+# Opt-in per-rerun instrumentation for the Streamlit apps: named stage
+# timings, peak traced memory and cache hit rates, shown in a sidebar panel
+# and emitted as one JSON log line per rerun.
+#
+# Enable with the environment variable APP_DEBUG=1 (all sessions) or by
+# opening the app with ?debug=1 (one session); the query parameter is only
+# honoured when APP_DEBUG_ALLOW=1 is set, so visitors cannot switch it on.
+# APP_PERF_LOG=<path> also appends the log lines to a JSONL file for
+# aggregation.
+#
+#   @instrumentation.cached("load_dataset", st.cache_resource(max_entries=4))
+#   def load_dataset(...): ...
+#
+#   prof = instrumentation.begin("dashboard")
+#   prof.mark("parse")     # ends the previous stage, starts "parse"
+#   ...
+#   prof.mark("render")
+#   ...
+#   prof.finish()          # ends the last stage, renders the panel, logs
+#
+# tracemalloc is process-wide: it runs while at least one debug rerun is
+# active and is stopped again when the last one finishes. A rerun that stops
+# early is released by the next rerun of its session. With concurrent debug
+# sessions the peaks include the other sessions' allocations.
+#
+# Log lines carry the Streamlit session id, the same id jobs.py uses for job
+# holders.
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+
+import streamlit as st
+
+import jobs
+
+logger = logging.getLogger("perf")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+_local = threading.local()
+_tracing = {'recorders': 0, 'lock': threading.Lock()}
+
+
+def enabled():
+    if os.getenv("APP_DEBUG") == "1":
+        return True
+    if os.getenv("APP_DEBUG_ALLOW") != "1":
+        return False
+    try:
+        return st.query_params.get("debug") == "1"
+    except Exception:
+        return False
+
+
+class Recorder:
+    def __init__(self, app, active):
+        self.app = app
+        self.active = active
+        self.stages = []
+        self.cache = {}
+        self.started = time.perf_counter()
+        self.open_stage = None
+        if active:
+            with _tracing['lock']:
+                _tracing['recorders'] += 1
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+            tracemalloc.reset_peak()
+            # Called at most once: by finish(), by the session's next begin(),
+            # or when an abandoned session's recorder is garbage collected
+            self.release = weakref.finalize(self, _stop_tracing)
+
+    def mark(self, name):
+        # Stages run back to back; each one resets the tracemalloc peak
+        if not self.active:
+            return
+        self.close_stage()
+        tracemalloc.reset_peak()
+        self.open_stage = (name, time.perf_counter())
+
+    def close_stage(self):
+        if self.open_stage is None:
+            return
+        name, start = self.open_stage
+        self.open_stage = None
+        self.stages.append({
+            'stage': name,
+            'ms': (time.perf_counter() - start) * 1000,
+            'peak_mb': tracemalloc.get_traced_memory()[1] / 1e6,
+        })
+
+    def cache_event(self, name, hit):
+        counts = self.cache.setdefault(name, {'hits': 0, 'misses': 0})
+        counts['hits' if hit else 'misses'] += 1
+
+    def summary(self):
+        peak = max([s['peak_mb'] for s in self.stages] + [tracemalloc.get_traced_memory()[1] / 1e6])
+        return {
+            'app': self.app,
+            'session': jobs.session_id(),
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'peak_mb': peak,
+            'stages': self.stages,
+            'cache': self.cache,
+        }
+
+    def finish(self):
+        # Render the sidebar panel and emit the log line; a no-op when disabled
+        if not self.active:
+            return
+        self.close_stage()
+        _local.recorder = None
+        summary = self.summary()
+        self.release()
+        log_line = json.dumps(summary)
+        logger.info(log_line)
+        log_path = os.getenv("APP_PERF_LOG")
+        if log_path:
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(log_line + "\n")
+        with st.sidebar.expander("⏱️ Prestaties (debug)", expanded=True):
+            st.caption(f"Rerun: {summary['total_ms']:.0f} ms, piekgeheugen {summary['peak_mb']:.1f} MB")
+            if self.stages:
+                st.dataframe(
+                    [{'Stap': s['stage'], 'ms': round(s['ms'], 1), 'Piek MB': round(s['peak_mb'], 1)} for s in self.stages],
+                    hide_index=True,
+                )
+            if self.cache:
+                st.dataframe(
+                    [
+                        {'Cache': name, 'Hits': c['hits'], 'Misses': c['misses'],
+                         'Hit rate': f"{c['hits'] / (c['hits'] + c['misses']):.0%}"}
+                        for name, c in self.cache.items()
+                    ],
+                    hide_index=True,
+                )
+
+
+def _stop_tracing():
+    with _tracing['lock']:
+        _tracing['recorders'] -= 1
+        if _tracing['recorders'] == 0:
+            tracemalloc.stop()
+
+
+def begin(app):
+    # One recorder per rerun, bound to the script thread. A rerun that never
+    # reached finish() (st.stop, interrupted by a widget change) is released
+    # here, so its tracemalloc reference does not outlive it.
+    previous = st.session_state.get('perf_recorder')
+    if previous is not None:
+        previous.release()
+    recorder = Recorder(app, enabled())
+    st.session_state['perf_recorder'] = recorder if recorder.active else None
+    _local.recorder = recorder if recorder.active else None
+    return recorder
+
+
+def current():
+    return getattr(_local, 'recorder', None)
+
+
+def cached(name, cache_decorator):
+    # Apply a Streamlit cache decorator and count hits/misses for the active
+    # recorder. functools.wraps keeps the cache key and the _-prefixed
+    # unhashed arguments of the original function.
+    def decorate(fn):
+        @functools.wraps(fn)
+        def compute(*args, **kwargs):
+            recorder = current()
+            if recorder is not None:
+                recorder.cache_event(name, hit=False)
+            return fn(*args, **kwargs)
+
+        cached_fn = cache_decorator(compute)
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            recorder = current()
+            if recorder is None:
+                return cached_fn(*args, **kwargs)
+            before = recorder.cache.get(name, {}).get('misses', 0)
+            result = cached_fn(*args, **kwargs)
+            if recorder.cache.get(name, {}).get('misses', 0) == before:
+                recorder.cache_event(name, hit=True)
+            return result
+
+        call.clear = cached_fn.clear
+        return call
+    return decorate
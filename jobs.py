@@ -0,0 +1,149 @@
+# Shared background job executor for long stages (parsing, pruning, exports).
+#
+# Jobs run on a thread pool shared by all sessions and are keyed: submitting
+# a key that is already queued, running or finished attaches to that job
+# instead of starting it again. Each session holds at most one job per slot;
+# submitting a different key to a slot releases the previous job, and a job
+# nobody holds any more is cancelled. A widget change during wait() only
+# interrupts the waiting script, so the next rerun re-attaches to the same
+# job instead of starting over.
+#
+#   job = jobs.submit('rdf_parse', file_hash, load_triples, data)
+#   g, df = jobs.wait(job, "RDF inlezen...")
+#
+# The job function receives a `progress(fraction, text=None)` keyword
+# argument; calling it records progress and raises JobCancelled once the job
+# is cancelled, so functions should call it between chunks of work.
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+JOB_WORKERS = int(os.getenv("APP_JOB_WORKERS", "4"))
+JOB_TTL = 1800
+POLL_SECONDS = 0.2
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key):
+        self.key = key
+        self.fraction = 0.0
+        self.text = None
+        self.cancel_event = threading.Event()
+        self.holders = set()
+        self.touched = time.time()
+        self.future = None
+
+    def report(self, fraction, text=None):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.fraction = min(max(float(fraction), 0.0), 1.0)
+        self.text = text
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+
+@st.cache_resource
+def registry():
+    return {
+        'executor': ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job"),
+        'jobs': {},
+        'lock': threading.Lock(),
+    }
+
+
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "no-session"
+
+
+def slot_key(slot):
+    return f"job_slot_{slot}"
+
+
+def _release(reg, job_key, holder):
+    job = reg['jobs'].get(job_key)
+    if job is None:
+        return
+    job.holders.discard(holder)
+    if not job.holders:
+        if not job.done():
+            job.cancel()
+        del reg['jobs'][job_key]
+
+
+def _evict_stale(reg):
+    # Finished jobs of sessions that went away
+    now = time.time()
+    for job_key, job in list(reg['jobs'].items()):
+        if job.done() and now - job.touched > JOB_TTL:
+            del reg['jobs'][job_key]
+
+
+def submit(slot, key, fn, *args, **kwargs):
+    reg = registry()
+    holder = (session_id(), slot)
+    job_key = (fn.__module__, fn.__qualname__, key)
+    previous = st.session_state.get(slot_key(slot))
+    with reg['lock']:
+        _evict_stale(reg)
+        if previous is not None and previous != job_key:
+            _release(reg, previous, holder)
+        job = reg['jobs'].get(job_key)
+        failed = job is not None and job.done() and (job.future.cancelled() or job.future.exception() is not None)
+        if job is None or failed or job.cancel_event.is_set():
+            job = Job(key)
+            job.future = reg['executor'].submit(fn, *args, progress=job.report, **kwargs)
+            reg['jobs'][job_key] = job
+        job.holders.add(holder)
+        job.touched = time.time()
+    st.session_state[slot_key(slot)] = job_key
+    return job
+
+
+def current(slot):
+    # The job this session holds in `slot`, if it is still registered
+    job_key = st.session_state.get(slot_key(slot))
+    return registry()['jobs'].get(job_key) if job_key is not None else None
+
+
+def release(slot):
+    reg = registry()
+    job_key = st.session_state.pop(slot_key(slot), None)
+    if job_key is not None:
+        with reg['lock']:
+            _release(reg, job_key, (session_id(), slot))
+
+
+def wait(job, label, container=None, cancellable=False):
+    # Block this rerun until the job is done, with a progress bar. Raises the
+    # job's exception, or JobCancelled when it was cancelled.
+    if not job.done():
+        container = container or st
+        bar = container.progress(0.0, text=label)
+        stop = container.button("Annuleren", key=f"cancel_{id(job)}") if cancellable else False
+        if stop:
+            job.cancel()
+        while not job.done():
+            bar.progress(job.fraction, text=f"{label} {job.text or f'{job.fraction:.0%}'}")
+            time.sleep(POLL_SECONDS)
+        bar.empty()
+    job.touched = time.time()
+    if job.future.cancelled():
+        raise JobCancelled()
+    return job.result()
@@ -0,0 +1,290 @@
+# Metadata store, search, filters and MDTO export for the metadata viewer.
+# Filters and searches work on row positions and value codes that are built
+# once per uploaded CSV.
+import json
+import re
+import tempfile
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+LLM_FIELDS = ['ai_summary', 'image_description']
+LLM_TOP_K = 20
+LLM_TOKEN_BUDGET = 3000
+
+
+# MDTO export: one groupby aggregation per file_key, written in chunks to a
+# temporary file (or to the binary file `out`)
+def write_mdto_json(filtered, chunk_size=10000, progress=None, out=None):
+    if out is None:
+        out = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024, mode='w+b')
+    if filtered.empty:
+        out.write(json.dumps({'MDTO': []}, ensure_ascii=False, indent=2).encode('utf-8'))
+        out.seek(0)
+        return out
+
+    dumps = lambda v: json.dumps(v, ensure_ascii=False)
+    pairs = (
+        '        ' + filtered['metadata_field'].map(dumps)
+        + ': ' + filtered['metadata_value'].map(dumps)
+    )
+    docs = pairs.groupby(filtered['file_key'], sort=True).agg(',\n'.join)
+    keys = docs.index.to_series().map(dumps)
+    docs = (
+        '    {\n      "file_key": ' + keys
+        + ',\n      "metadata": {\n' + docs
+        + '\n      }\n    }'
+    )
+
+    out.write(b'{\n  "MDTO": [\n')
+    for start in range(0, len(docs), chunk_size):
+        if start:
+            out.write(b',\n')
+        out.write(',\n'.join(docs.iloc[start:start + chunk_size]).encode('utf-8'))
+        if progress:
+            progress(min(start + chunk_size, len(docs)) / len(docs), f"{min(start + chunk_size, len(docs)):,} documenten")
+    out.write(b'\n  ]\n}')
+    out.seek(0)
+    return out
+
+
+# Metadata store built from the long-format CSV (a path or file object). Type
+# and field filters look up precomputed row positions per (file type,
+# metadata field) instead of scanning the whole table.
+def build_metadata_store(source):
+    frame = pd.read_csv(source)
+
+    # File type per file_key (the last file_extension value, as before)
+    ext = frame[frame['metadata_field'] == 'file_extension'].drop_duplicates(subset='file_key', keep='last')
+    ext_map = ext.set_index('file_key')['metadata_value']
+
+    frame = frame.drop_duplicates(subset=['file_key', 'metadata_field'], keep='first')
+    frame = frame.reset_index(drop=True)
+    frame['file_key'] = frame['file_key'].astype('category')
+    frame['metadata_field'] = frame['metadata_field'].astype('category')
+
+    types = sorted(ext_map.dropna().unique())
+    row_type = frame['file_key'].astype(object).map(ext_map)
+    cell_rows = pd.Series(range(len(frame))).groupby(
+        [row_type, frame['metadata_field'].astype(object)], sort=False
+    ).indices
+    type_fields = {}
+    for t, field in cell_rows:
+        type_fields.setdefault(t, set()).add(field)
+    ext_rows = pd.DataFrame({
+        'file_key': ext_map.index,
+        'metadata_field': 'file_extension',
+        'metadata_value': ext_map.values,
+    })
+    type_ext_rows = ext_rows.groupby('metadata_value', sort=False).indices
+
+    # Value codes for the search index; NaN gets code -1
+    codes, unique_values = pd.factorize(
+        pd.concat([frame['metadata_value'], ext_rows['metadata_value']], ignore_index=True)
+    )
+    frame['value_code'] = codes[:len(frame)]
+    ext_rows['value_code'] = codes[len(frame):]
+
+    # Parse the timestamps of date fields once, with a time-sorted index of
+    # row positions per field for the date range filters
+    date_index = {}
+    for field in frame['metadata_field'].cat.categories:
+        if not is_date_field(field):
+            continue
+        field_rows = np.flatnonzero((frame['metadata_field'] == field).to_numpy())
+        stamps = pd.to_datetime(
+            frame['metadata_value'].iloc[field_rows], format='%Y-%m-%d %H:%M:%S', errors='coerce'
+        ).to_numpy()
+        valid = ~np.isnat(stamps)
+        if not valid.any():
+            continue
+        order = np.argsort(stamps[valid], kind='stable')
+        date_index[field] = {
+            'rows': field_rows,
+            'sorted_stamps': stamps[valid][order],
+            'sorted_rows': field_rows[valid][order],
+        }
+    return {
+        'frame': frame,
+        'types': types,
+        'cell_rows': cell_rows,
+        'type_fields': type_fields,
+        'ext_rows': ext_rows,
+        'type_ext_rows': type_ext_rows,
+        'unique_values': unique_values,
+        'date_index': date_index,
+    }
+
+
+def is_date_field(field):
+    return 'timestamp' in field or field.endswith('_created') or field.endswith('_modified')
+
+
+def date_range_rows(store, field, start, end):
+    # Row positions of `field` with a date between start and end (inclusive)
+    index = store['date_index'][field]
+    stamps = index['sorted_stamps']
+    lo = np.searchsorted(stamps, pd.Timestamp(start).to_datetime64(), side='left')
+    hi = np.searchsorted(stamps, (pd.Timestamp(end) + pd.Timedelta(days=1)).to_datetime64(), side='left')
+    return index['sorted_rows'][lo:hi]
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+# Search index over the unique metadata values: exact values, a token index
+# (token -> value ids) and a trigram index over the token vocabulary for
+# substring search. Built on the first search and kept in the store.
+def get_search_index(store):
+    if 'search' not in store:
+        exact = {}
+        postings = {}
+        for vid, value in enumerate(store['unique_values']):
+            if not isinstance(value, str):
+                continue
+            text = value.lower()
+            exact.setdefault(text, []).append(vid)
+            for tok in set(TOKEN_RE.findall(text)):
+                postings.setdefault(tok, []).append(vid)
+        vocab = list(postings)
+        trigrams = {}
+        for tid, tok in enumerate(vocab):
+            for i in range(len(tok) - 2):
+                trigrams.setdefault(tok[i:i + 3], set()).add(tid)
+        store['search'] = {
+            'exact': exact,
+            'postings': [postings[tok] for tok in vocab],
+            'vocab': vocab,
+            'trigrams': trigrams,
+            'lower': [v.lower() if isinstance(v, str) else None for v in store['unique_values']],
+        }
+    return store['search']
+
+
+def tokens_containing(index, part):
+    # Ids of the tokens that contain `part`
+    vocab = index['vocab']
+    if len(part) < 3:
+        return [tid for tid, tok in enumerate(vocab) if part in tok]
+    grams = [index['trigrams'].get(part[i:i + 3], set()) for i in range(len(part) - 2)]
+    candidates = set.intersection(*grams) if all(grams) else set()
+    return [tid for tid in candidates if part in vocab[tid]]
+
+
+def match_values(store, kw_lower, partial):
+    # Boolean lookup per value code (the last position is for code -1)
+    index = get_search_index(store)
+    lut = np.zeros(len(store['unique_values']) + 1, dtype=bool)
+    if not partial:
+        lut[index['exact'].get(kw_lower, [])] = True
+        return lut
+    lower = index['lower']
+    parts = TOKEN_RE.findall(kw_lower)
+    if parts:
+        candidates = None
+        for part in parts:
+            vids = set()
+            for tid in tokens_containing(index, part):
+                vids.update(index['postings'][tid])
+            candidates = vids if candidates is None else candidates & vids
+            if not candidates:
+                break
+    else:
+        candidates = range(len(lower))
+    lut[[vid for vid in candidates if lower[vid] is not None and kw_lower in lower[vid]]] = True
+    return lut
+
+
+# BM25 index over the values of the LLM fields (token -> {value code: tf}),
+# built once per dataset and kept in the store
+def get_summary_index(store):
+    if 'summary_index' not in store:
+        frame = store['frame']
+        codes = np.unique(frame.loc[frame['metadata_field'].isin(LLM_FIELDS), 'value_code'].to_numpy())
+        postings = {}
+        lengths = {}
+        for code in codes:
+            value = store['unique_values'][code] if code >= 0 else None
+            if not isinstance(value, str):
+                continue
+            tokens = TOKEN_RE.findall(value.lower())
+            lengths[code] = len(tokens)
+            for tok, tf in Counter(tokens).items():
+                postings.setdefault(tok, {})[code] = tf
+        store['summary_index'] = {
+            'postings': postings,
+            'lengths': lengths,
+            'avg_length': (sum(lengths.values()) / len(lengths)) if lengths else 0.0,
+        }
+    return store['summary_index']
+
+
+def retrieve_context(store, subset, question, top_k=LLM_TOP_K, token_budget=LLM_TOKEN_BUDGET):
+    # The best scoring documents (BM25 over the summaries), up to top_k
+    # documents or the token budget (roughly 4 characters per token)
+    index = get_summary_index(store)
+    n_values = len(index['lengths'])
+    value_scores = {}
+    k1, b = 1.5, 0.75
+    for tok in set(TOKEN_RE.findall(question.lower())):
+        postings = index['postings'].get(tok)
+        if not postings:
+            continue
+        idf = np.log(1 + (n_values - len(postings) + 0.5) / (len(postings) + 0.5))
+        for code, tf in postings.items():
+            norm = 1 - b + b * index['lengths'][code] / index['avg_length']
+            value_scores[code] = value_scores.get(code, 0.0) + idf * tf * (k1 + 1) / (tf + k1 * norm)
+
+    scores = subset['value_code'].map(value_scores).fillna(0.0).groupby(subset['file_key'], sort=True).sum()
+    ranked = scores.sort_values(ascending=False, kind='stable').index
+    groups = subset.groupby('file_key', sort=False)
+    context = {}
+    used = 0
+    for file_key in ranked[:top_k]:
+        group = groups.get_group(file_key)
+        md = dict(zip(group['metadata_field'], group['metadata_value']))
+        cost = len(json.dumps({file_key: md}, indent=2)) // 4
+        if used + cost > token_budget:
+            continue
+        context[file_key] = md
+        used += cost
+    return context
+
+
+def select_rows(store, types, fields, date_ranges=None):
+    # Rows of the chosen file types and fields in CSV order, plus each
+    # document's file_extension row. Rows of date fields outside their date
+    # range are dropped.
+    cell_rows = store['cell_rows']
+    parts = [cell_rows[(t, f)] for t in types for f in fields if (t, f) in cell_rows]
+    rows = np.sort(np.concatenate(parts)) if parts else np.array([], dtype=int)
+    if date_ranges:
+        keep = np.ones(len(store['frame']), dtype=bool)
+        for field, (start, end) in date_ranges.items():
+            keep[store['date_index'][field]['rows']] = False
+            keep[date_range_rows(store, field, start, end)] = True
+        rows = rows[keep[rows]]
+    selected = store['frame'].iloc[rows]
+    selected = selected.astype({'file_key': object, 'metadata_field': object})
+    if 'file_extension' not in fields:
+        type_ext_rows = store['type_ext_rows']
+        ext_parts = [type_ext_rows[t] for t in types if t in type_ext_rows]
+        if ext_parts:
+            ext_rows = store['ext_rows'].iloc[np.sort(np.concatenate(ext_parts))]
+            selected = pd.concat([selected, ext_rows], ignore_index=True)
+    return selected.reset_index(drop=True)
+
+
+def keyword_filter(store, filtered, kw_lower, partial):
+    # Rows whose field or value matches the keyword
+    matched_fields = [
+        f for f in store['frame']['metadata_field'].cat.categories
+        if (kw_lower in f.lower() if partial else f.lower() == kw_lower)
+    ]
+    value_lut = match_values(store, kw_lower, partial)
+    mask = (
+        filtered['metadata_field'].isin(matched_fields).to_numpy() |
+        value_lut[filtered['value_code'].to_numpy()]
+    )
+    return filtered[mask]
@@ -0,0 +1,148 @@
+# Loading, statistics, filters and graph building for the RDF viewer.
+# pyvis is only imported once a network is built.
+import os
+from contextlib import nullcontext
+
+import pandas as pd
+from rdflib import Graph, URIRef
+
+TRIPLE_COLUMNS = ["Subject", "Predicate", "Object"]
+RDF_TYPE = str(URIRef("http://www.w3.org/1999/02/22-rdf-syntax-ns#type"))
+NT_CHUNK_LINES = 50_000
+PALETTE = ["red", "blue", "green", "orange", "purple", "teal", "brown", "pink", "gray", "cyan"]
+
+
+def remaining_size(f):
+    # Bytes left in a seekable stream, None when it cannot tell
+    try:
+        pos = f.tell()
+        size = f.seek(0, os.SEEK_END)
+        f.seek(pos)
+        return size - pos
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def load_triples(source, progress=None):
+    # Parse N-Triples (a path or file object) into a graph plus a string
+    # DataFrame of all triples. N-Triples is line-based, so the input is read
+    # line by line and parsed in batches of lines that share one blank-node
+    # context. Lines are split on "\n" only: str.splitlines() would also split
+    # on characters such as U+2028 that literals may contain unescaped.
+    with nullcontext(source) if hasattr(source, 'read') else open(source, 'rb') as f:
+        total = remaining_size(f)
+        g = Graph()
+        bnodes = {}
+        batch = []
+        read = 0
+
+        def parse_batch():
+            data = b''.join(batch).decode('utf-8') if isinstance(batch[0], bytes) else ''.join(batch)
+            g.parse(data=data, format="nt", bnode_context=bnodes)
+            batch.clear()
+            if progress:
+                progress(read / total if total else 0.0, f"{len(g):,} triples")
+
+        for line in f:
+            batch.append(line)
+            read += len(line)
+            if len(batch) == NT_CHUNK_LINES:
+                parse_batch()
+        if batch:
+            parse_batch()
+    df = pd.DataFrame([(str(s), str(p), str(o)) for s, p, o in g], columns=TRIPLE_COLUMNS)
+    return g, df
+
+
+def date_triples(df):
+    # Triples of date/time predicates with their parsed date
+    preds = [p for p in df['Predicate'].unique() if 'date' in p.lower() or 'time' in p.lower()]
+    if not preds:
+        return pd.DataFrame()
+    df_date = df[df['Predicate'].isin(preds)].copy()
+    df_date['Date'] = pd.to_datetime(df_date['Object'], errors='coerce')
+    return df_date.dropna(subset=['Date'])
+
+
+def triple_stats(df):
+    stats = {
+        'total_triples': len(df),
+        'unique_subjects': df['Subject'].nunique(),
+        'unique_predicates': df['Predicate'].nunique(),
+        'unique_objects': df['Object'].nunique(),
+        'top_predicates': df['Predicate'].value_counts().head(10),
+        'top_subjects': df['Subject'].value_counts().head(10),
+        'numeric_bins': None,
+        'date_counts': None,
+    }
+    numeric = pd.to_numeric(df['Object'], errors='coerce')
+    if numeric.notna().any():
+        num_counts = pd.cut(numeric, bins=10).value_counts().sort_index()
+        num_counts.index = num_counts.index.astype(str)
+        stats['numeric_bins'] = num_counts
+    df_date = date_triples(df)
+    if not df_date.empty:
+        stats['date_counts'] = df_date['Date'].dt.date.value_counts().sort_index()
+    return stats
+
+
+def regex_filter(df, sub_f="", pred_f="", obj_f=""):
+    filtered = df.copy()
+    if sub_f:
+        filtered = filtered[filtered['Subject'].str.contains(sub_f, regex=True)]
+    if pred_f:
+        filtered = filtered[filtered['Predicate'].str.contains(pred_f, regex=True)]
+    if obj_f:
+        filtered = filtered[filtered['Object'].str.contains(obj_f, regex=True)]
+    return filtered
+
+
+def node_types(df):
+    # rdf:type per subject (the last one wins)
+    typed = df[df['Predicate'] == RDF_TYPE]
+    return dict(zip(typed['Subject'], typed['Object']))
+
+
+def build_network(vis_df, types, type_colors, pred_colors, pred_counts, node_label="URI", edge_label="URI"):
+    from pyvis.network import Network
+    max_count = pred_counts.max() if not pred_counts.empty else 1
+    net = Network(height="600px", directed=True)
+    for _, r in vis_df.iterrows():
+        subj = str(r['Subject'])
+        obj = str(r['Object'])
+        s_lbl = subj if node_label == "URI" else subj.split('/')[-1]
+        o_lbl = obj if node_label == "URI" else obj.split('/')[-1]
+        pred = str(r['Predicate'])
+        e_lbl = pred if edge_label == "URI" else pred.split('/')[-1]
+        weight = pred_counts.get(pred, 1)
+        width = 1 + (weight - 1) / (max_count - 1) * 4 if max_count > 1 else 2
+        net.add_node(subj, label=s_lbl, color=type_colors.get(types.get(subj), "gray"))
+        net.add_node(obj, label=o_lbl, color=type_colors.get(types.get(obj), "gray"))
+        net.add_edge(subj, obj, label=e_lbl, color=pred_colors.get(pred, "lightgray"), width=width)
+    net.set_options('{"interaction":{"hover":true,"hoverConnectedEdges":true,"selectConnectedEdges":true}}')
+    return net
+
+
+def geo_points(df):
+    # (subject, lat, lon) per subject with coordinates, plus its photo URLs
+    lat_preds = [p for p in df['Predicate'].unique() if 'lat' in p.lower()]
+    lon_preds = [p for p in df['Predicate'].unique() if 'long' in p.lower() or 'lng' in p.lower()]
+    img_preds = [p for p in df['Predicate'].unique() if any(x in p.lower() for x in ['image', 'foto', 'depict'])]
+    if not (lat_preds and lon_preds):
+        return None, {}
+    df_geo = df[df['Predicate'].isin(lat_preds + lon_preds)]
+    geo_pivot = df_geo.pivot_table(index='Subject', columns='Predicate', values='Object', aggfunc='first')
+    coords = []
+    photo_map = {}
+    for subj in geo_pivot.index:
+        try:
+            lat = float(geo_pivot.loc[subj, lat_preds[0]])
+            lon = float(geo_pivot.loc[subj, lon_preds[0]])
+        except Exception:
+            continue
+        fotos = []
+        if img_preds:
+            fotos = df[(df['Subject'] == subj) & (df['Predicate'].isin(img_preds))]['Object'].tolist()
+        photo_map[subj] = fotos
+        coords.append((subj, lat, lon))
+    return coords, photo_map
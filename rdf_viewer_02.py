@@ -1,23 +1,12 @@
 import streamlit as st
+import importlib.util
+
+# Check for required libraries (zonder ze te laden; dat gebeurt pas bij gebruik)
+for module in ["rdflib", "pandas", "pyvis"]:
+    if importlib.util.find_spec(module) is None:
+        st.error(f"Module '{module}' niet gevonden. Voeg '{module}' toe aan requirements.txt en herdeploy de app.")
+        st.stop()
 
-# Check for required libraries
-try:
-    from rdflib import Graph, URIRef
-    import pandas as pd
-    from pyvis.network import Network
-except ModuleNotFoundError as e:
-    missing = str(e).split(" ")[-1].strip("'")
-    st.error(f"Module '{missing}' niet gevonden. Voeg '{missing}' toe aan requirements.txt en herdeploy de app.")
-    st.stop()
-
-import pandas as pd
-from rdflib import Graph, URIRef
-from pyvis.network import Network
-import tempfile
-import os
-from rdflib import Graph, URIRef
-import pandas as pd
-from pyvis.network import Network
 import tempfile
 import os
 
@@ -36,12 +25,14 @@ uploaded_file = st.file_uploader("📂 Upload RDF (.nt) file", type=["nt"])
 
 # Session state voor SPARQL-resultaten
 if 'sparql_df' not in st.session_state:
-    st.session_state['sparql_df'] = pd.DataFrame(columns=["Subject","Predicate","Object"])
+    st.session_state['sparql_df'] = None
 
 if uploaded_file:
+    import pandas as pd
+    from rdf_core import RDF_TYPE, load_triples, regex_filter
+
     # Parse RDF
-    g = Graph()
-    g.parse(uploaded_file, format="nt")
+    g, df = load_triples(uploaded_file)
 
     # Unieke termen voor builder
     subjects = sorted({s for s,p,o in g}, key=lambda t: str(t))
@@ -52,9 +43,6 @@ if uploaded_file:
     pred_map = {str(p): p.n3() for p in predicates}
     obj_map = {str(o): o.n3() for o in objects}
 
-    # Basis DataFrame
-    df = pd.DataFrame([(str(s),str(p),str(o)) for s,p,o in g], columns=["Subject","Predicate","Object"])
-
     # Klikbare links
     def linkify(val):
         return f'<a href="{val}" target="_blank">{val}</a>' if val.startswith("http") else val
@@ -73,13 +61,7 @@ if uploaded_file:
         sub_f = st.text_input("Subject regex")
         pred_f = st.text_input("Predicate regex")
         obj_f = st.text_input("Object regex")
-        filtered_adv = df.copy()
-        if sub_f:
-            filtered_adv = filtered_adv[filtered_adv['Subject'].str.contains(sub_f, regex=True)]
-        if pred_f:
-            filtered_adv = filtered_adv[filtered_adv['Predicate'].str.contains(pred_f, regex=True)]
-        if obj_f:
-            filtered_adv = filtered_adv[filtered_adv['Object'].str.contains(obj_f, regex=True)]
+        filtered_adv = regex_filter(df, sub_f, pred_f, obj_f)
 
     # SPARQL Query Builder
     st.subheader("🧪 SPARQL Query Builder")
@@ -132,11 +114,10 @@ if uploaded_file:
             st.error(f"SPARQL error: {e}")
 
     if clear_clicked:
-        st.session_state['sparql_df'] = pd.DataFrame(columns=["Subject","Predicate","Object"])
+        st.session_state['sparql_df'] = None
 
     # Filter op rdf:type
-    type_uri = URIRef("http://www.w3.org/1999/02/22-rdf-syntax-ns#type")
-    type_vals = df[df['Predicate'] == str(type_uri)]['Object'].unique().tolist()
+    type_vals = df[df['Predicate'] == RDF_TYPE]['Object'].unique().tolist()
     sel_type = st.selectbox("Filter type", ["(all)"] + sorted(type_vals))
     if sel_type != "(all)":
         subs = df[df['Object'] == sel_type]['Subject']
@@ -145,13 +126,14 @@ if uploaded_file:
         df_type = df
 
     # Bepaal vis_df
-    if not st.session_state['sparql_df'].empty:
+    if st.session_state['sparql_df'] is not None and not st.session_state['sparql_df'].empty:
         vis_df = st.session_state['sparql_df']
     else:
         vis_df = pd.merge(df_type, filtered_adv, how='inner')
 
     # Visualisatie
     st.subheader("🌐 Visualisatie")
+    from pyvis.network import Network
     net = Network(height="600px", width="100%", directed=True)
     for _, r in vis_df.iterrows():
         subj_id = str(r['Subject'])
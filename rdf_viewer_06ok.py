@@ -1,22 +1,22 @@
 import streamlit as st
+import importlib.util
 
-# Check for required libraries
-try:
-    from rdflib import Graph, URIRef
-    import pandas as pd
-    from pyvis.network import Network
-except ModuleNotFoundError as e:
-    missing = str(e).split()[-1].strip("'")
-    st.error(f"Module '{missing}' niet gevonden. Voeg '{missing}' toe aan requirements.txt en herdeploy de app.")
-    st.stop()
+# Check for required libraries (zonder ze te laden; dat gebeurt pas bij gebruik)
+for module in ["pandas", "rdflib", "pyvis", "folium", "streamlit_folium"]:
+    if importlib.util.find_spec(module) is None:
+        st.error(f"Module '{module}' niet gevonden. Voeg '{module}' toe aan requirements.txt en herdeploy de app.")
+        st.stop()
 
 import tempfile
-from streamlit_folium import st_folium
+import hashlib
+import io
+import instrumentation
+import jobs
 import os
-from datetime import datetime
 
 st.set_page_config(layout="wide")
 st.title("🧩 RDF Viewer & Visualisatie")
+prof = instrumentation.begin("rdf_viewer")
 
 # Prefix-definities
 st.subheader("📐 Prefix-instellingen")
@@ -30,48 +30,45 @@ uploaded_file = st.file_uploader("📂 Upload RDF (.nt) file", type=["nt"])
 
 # Session state defaults
 if 'sparql_df' not in st.session_state:
-    st.session_state['sparql_df'] = pd.DataFrame(columns=["Subject","Predicate","Object"])
+    st.session_state['sparql_df'] = None
 if 'viz_started' not in st.session_state:
     st.session_state['viz_started'] = False
 
 if uploaded_file:
+    import pandas as pd
+    from rdf_core import (
+        RDF_TYPE, PALETTE, load_triples, date_triples, triple_stats,
+        regex_filter, node_types as get_node_types, build_network, geo_points,
+    )
+
     # Parse RDF
-    g = Graph()
-    g.parse(uploaded_file, format="nt")
-    df = pd.DataFrame([(str(s), str(p), str(o)) for s,p,o in g], columns=["Subject","Predicate","Object"])
+    prof.mark("parse")
+    data = uploaded_file.getvalue()
+    job = jobs.submit('rdf_parse', hashlib.sha256(data).hexdigest(), load_triples, io.BytesIO(data))
+    g, df = jobs.wait(job, "RDF inlezen...")
 
     # Data-overzicht en statistieken (expander)
+    prof.mark("stats")
     with st.expander("📊 Data-overzicht en statistieken", expanded=False):
-        total_triples = len(df)
-        unique_subjects = df['Subject'].nunique()
-        unique_predicates = df['Predicate'].nunique()
-        unique_objects = df['Object'].nunique()
+        stats = triple_stats(df)
         c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Totaal triples", total_triples)
-        c2.metric("Unieke Subjects", unique_subjects)
-        c3.metric("Unieke Predicates", unique_predicates)
-        c4.metric("Unieke Objects", unique_objects)
+        c1.metric("Totaal triples", stats['total_triples'])
+        c2.metric("Unieke Subjects", stats['unique_subjects'])
+        c3.metric("Unieke Predicates", stats['unique_predicates'])
+        c4.metric("Unieke Objects", stats['unique_objects'])
         st.write("**Top 10 Predicates**")
-        st.bar_chart(df['Predicate'].value_counts().head(10))
+        st.bar_chart(stats['top_predicates'])
         st.write("**Top 10 Subjects**")
-        st.bar_chart(df['Subject'].value_counts().head(10))
-        df_num = df.copy()
-        df_num['NumericValue'] = pd.to_numeric(df_num['Object'], errors='coerce')
-        if df_num['NumericValue'].notna().any():
+        st.bar_chart(stats['top_subjects'])
+        if stats['numeric_bins'] is not None:
             st.write("**Verdeling numerieke literal-waarden**")
-            num_counts = pd.cut(df_num['NumericValue'], bins=10).value_counts().sort_index()
-            num_counts.index = num_counts.index.astype(str)
-            st.bar_chart(num_counts)
-        date_preds = [p for p in df['Predicate'].unique() if 'date' in p.lower() or 'time' in p.lower()]
-        if date_preds:
-            df_date = df[df['Predicate'].isin(date_preds)].copy()
-            df_date['Date'] = pd.to_datetime(df_date['Object'], errors='coerce')
-            df_date = df_date.dropna(subset=['Date'])
-            if not df_date.empty:
-                st.write("**Tijdreeks van datumpredicates**")
-                st.line_chart(df_date['Date'].dt.date.value_counts().sort_index())
+            st.bar_chart(stats['numeric_bins'])
+        if stats['date_counts'] is not None:
+            st.write("**Tijdreeks van datumpredicates**")
+            st.line_chart(stats['date_counts'])
 
     # Klikbare triples
+    prof.mark("render")
     def linkify(val):
         return f'<a href="{val}" target="_blank">{val}</a>' if val.startswith("http") else val
     st.subheader("📄 RDF Triples (klikbaar)")
@@ -83,19 +80,15 @@ if uploaded_file:
     )
 
     # Geavanceerde filters
+    prof.mark("filter")
     with st.expander("⚙️ Geavanceerde filters", expanded=False):
         sub_f = st.text_input("Subject regex")
         pred_f = st.text_input("Predicate regex")
         obj_f = st.text_input("Object regex")
-        filtered_adv = df.copy()
-        if sub_f:
-            filtered_adv = filtered_adv[filtered_adv['Subject'].str.contains(sub_f, regex=True)]
-        if pred_f:
-            filtered_adv = filtered_adv[filtered_adv['Predicate'].str.contains(pred_f, regex=True)]
-        if obj_f:
-            filtered_adv = filtered_adv[filtered_adv['Object'].str.contains(obj_f, regex=True)]
+        filtered_adv = regex_filter(df, sub_f, pred_f, obj_f)
 
     # SPARQL Query Builder
+    prof.mark("query")
     subjects = sorted({s for s,p,o in g}, key=lambda t: str(t))
     predicates = sorted({p for s,p,o in g}, key=lambda t: str(t))
     objects = sorted({o for s,p,o in g}, key=lambda t: str(t))
@@ -124,17 +117,13 @@ if uploaded_file:
         except Exception as e:
             st.error(f"SPARQL error: {e}")
     if col_clear.button("Wis SPARQL"):
-        st.session_state['sparql_df'] = pd.DataFrame(columns=["Subject","Predicate","Object"])
+        st.session_state['sparql_df'] = None
 
     # Prepare time data
-    time_preds = [p for p in df['Predicate'].unique() if 'date' in p.lower() or 'time' in p.lower()]
-    df_time = pd.DataFrame()
-    if time_preds:
-        df_time = df[df['Predicate'].isin(time_preds)].copy()
-        df_time['Date'] = pd.to_datetime(df_time['Object'], errors='coerce')
-        df_time = df_time.dropna(subset=['Date'])
+    df_time = date_triples(df)
 
     # Visualisatie
+    prof.mark("graph")
     if not st.session_state['viz_started']:
         if st.button("Start visualisatie"):
             st.session_state['viz_started'] = True
@@ -152,19 +141,17 @@ if uploaded_file:
             )
             date_map = {row['Subject']: row['Date'].date() for _, row in df_time.iterrows()}
         # Type filter
-        type_uri = URIRef("http://www.w3.org/1999/02/22-rdf-syntax-ns#type")
-        sel_type = st.selectbox("Filter type", ["(all)"] + sorted(df[df['Predicate']==str(type_uri)]['Object'].unique()))
+        sel_type = st.selectbox("Filter type", ["(all)"] + sorted(df[df['Predicate']==RDF_TYPE]['Object'].unique()))
         df_type = df if sel_type=="(all)" else df[df['Object']==sel_type]
-        vis_df = st.session_state['sparql_df'] if not st.session_state['sparql_df'].empty else pd.merge(df_type, filtered_adv, how='inner')
+        sparql_df = st.session_state['sparql_df']
+        vis_df = sparql_df if sparql_df is not None and not sparql_df.empty else pd.merge(df_type, filtered_adv, how='inner')
         if not df_time.empty:
             vis_df = vis_df[vis_df['Subject'].map(date_map).between(start_date, end_date)]
         # Color mappings
-        node_types = {row['Subject']: row['Object'] for _, row in df[df['Predicate']==str(type_uri)].iterrows()}
-        palette = ["red","blue","green","orange","purple","teal","brown","pink","gray","cyan"]
-        type_colors = {t: palette[i%len(palette)] for i,t in enumerate(sorted(set(node_types.values())))}
+        node_types = get_node_types(df)
+        type_colors = {t: PALETTE[i%len(PALETTE)] for i,t in enumerate(sorted(set(node_types.values())))}
         pred_counts = vis_df['Predicate'].value_counts()
-        max_count = pred_counts.max() if not pred_counts.empty else 1
-        pred_colors = {p: palette[i%len(palette)] for i,p in enumerate(sorted(pred_counts.index))}
+        pred_colors = {p: PALETTE[i%len(PALETTE)] for i,p in enumerate(sorted(pred_counts.index))}
         # Sidebar filter styling
         st.sidebar.markdown(
             """
@@ -191,20 +178,7 @@ if uploaded_file:
         node_label = st.selectbox("Kies node label:", ["URI","Local Name"])
         edge_label = st.selectbox("Kies edge label:", ["URI","Local Name"])
         # Build network
-        net = Network(height="600px", directed=True)
-        for _,r in vis_filtered.iterrows():
-            subj = str(r['Subject'])
-            obj = str(r['Object'])
-            s_lbl = subj if node_label=="URI" else subj.split('/')[-1]
-            o_lbl = obj if node_label=="URI" else obj.split('/')[-1]
-            pred = str(r['Predicate'])
-            e_lbl = pred if edge_label=="URI" else pred.split('/')[-1]
-            weight = pred_counts.get(pred,1)
-            width = 1+(weight-1)/(max_count-1)*4 if max_count>1 else 2
-            net.add_node(subj, label=s_lbl, color=type_colors.get(node_types.get(subj),"gray"))
-            net.add_node(obj, label=o_lbl, color=type_colors.get(node_types.get(obj),"gray"))
-            net.add_edge(subj, obj, label=e_lbl, color=pred_colors.get(pred,"lightgray"), width=width)
-        net.set_options('{"interaction":{"hover":true,"hoverConnectedEdges":true,"selectConnectedEdges":true}}')
+        net = build_network(vis_filtered, node_types, type_colors, pred_colors, pred_counts, node_label, edge_label)
         tmp = tempfile.mkdtemp()
         path = os.path.join(tmp, "graph.html")
         net.write_html(path)
@@ -234,31 +208,13 @@ if uploaded_file:
         )
 
         # Optie 6: Geospatiale kaart
+        prof.mark("map")
         st.subheader("🌍 Geospatiale kaart")
-        # Detecteer geo predicaten
-        lat_preds = [p for p in df['Predicate'].unique() if 'lat' in p.lower()]
-        lon_preds = [p for p in df['Predicate'].unique() if 'long' in p.lower() or 'lng' in p.lower()]
-        # Detecteer foto predicaten
-        img_preds = [p for p in df['Predicate'].unique() if any(x in p.lower() for x in ['image', 'foto', 'depict'])]
-        if lat_preds and lon_preds:
-            df_geo = df[df['Predicate'].isin(lat_preds + lon_preds)]
-            geo_pivot = df_geo.pivot_table(index='Subject', columns='Predicate', values='Object', aggfunc='first')
-            coords = []
-            photo_map = {}
-            for subj in geo_pivot.index:
-                try:
-                    lat = float(geo_pivot.loc[subj, lat_preds[0]])
-                    lon = float(geo_pivot.loc[subj, lon_preds[0]])
-                except Exception:
-                    continue
-                # Verzamel foto's
-                fotos = []
-                if img_preds:
-                    fotos = df[(df['Subject']==subj) & (df['Predicate'].isin(img_preds))]['Object'].tolist()
-                photo_map[subj] = fotos
-                coords.append((subj, lat, lon))
+        coords, photo_map = geo_points(df)
+        if coords is not None:
             if coords:
                 import folium
+                from streamlit_folium import st_folium
                 # Centreer kaart
                 avg_lat = sum(lat for _, lat, _ in coords) / len(coords)
                 avg_lon = sum(lon for _, _, lon in coords) / len(coords)
@@ -297,3 +253,7 @@ if uploaded_file:
                 st.info("Geen geldige geo-coördinaten gevonden voor plotting.")
         else:
             st.info("Geen geo:lat en geo:long predicaten gevonden in de data.")
+else:
+    jobs.release('rdf_parse')
+
+prof.finish()
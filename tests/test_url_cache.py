@@ -0,0 +1,102 @@
+# dashboard_core.fetch_url against a local http.server stand-in: a full
+# download (200), revalidation (304), a changed resource and fresh entries
+# that are reused without a request.
+#
+#   python -m unittest discover tests      (or: python -m pytest tests)
+import http.server
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import dashboard_core  # noqa: E402
+
+
+class CSVHandler(http.server.BaseHTTPRequestHandler):
+    # Serves the server's `body` with an ETag derived from `version`
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        etag = f'"v{server.version}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(server.body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", "Mon, 19 Oct 2026 10:00:00 GMT")
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchUrlTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CSVHandler)
+        self.server.requests = []
+        self.server.version = 1
+        self.server.body = b"a,b\n1,2\n3,4\n"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/data.csv"
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.saved = dashboard_core.CACHE_DIR, dashboard_core.URL_FRESH_SECONDS
+        dashboard_core.CACHE_DIR = Path(self.cache_dir.name)
+
+    def tearDown(self):
+        dashboard_core.CACHE_DIR, dashboard_core.URL_FRESH_SECONDS = self.saved
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache_dir.cleanup()
+
+    def test_download_caches_file_and_validators(self):
+        seen = []
+        content_hash, path = dashboard_core.fetch_url(self.url, progress=lambda received, total: seen.append((received, total)))
+        self.assertEqual(path.read_bytes(), self.server.body)
+        self.assertEqual(seen[-1], (len(self.server.body), len(self.server.body)))
+        entry = dashboard_core.read_url_index()[self.url]
+        self.assertEqual((entry["hash"], entry["etag"]), (content_hash, '"v1"'))
+        self.assertEqual(entry["last_modified"], "Mon, 19 Oct 2026 10:00:00 GMT")
+
+    def test_fresh_entry_is_reused_without_a_request(self):
+        first = dashboard_core.fetch_url(self.url)
+        second = dashboard_core.fetch_url(self.url)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_stale_entry_is_revalidated_with_304(self):
+        dashboard_core.URL_FRESH_SECONDS = 0
+        first = dashboard_core.fetch_url(self.url)
+        mtime = first[1].stat().st_mtime_ns
+        second = dashboard_core.fetch_url(self.url)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.requests[1].get("If-None-Match"), '"v1"')
+        self.assertEqual(self.server.requests[1].get("If-Modified-Since"), "Mon, 19 Oct 2026 10:00:00 GMT")
+        self.assertEqual(first[1].stat().st_mtime_ns, mtime)
+
+    def test_changed_resource_is_downloaded_again(self):
+        first_hash, _ = dashboard_core.fetch_url(self.url)
+        self.server.version = 2
+        self.server.body = b"a,b\n5,6\n"
+        second_hash, path = dashboard_core.fetch_url(self.url, force=True)
+        self.assertNotEqual(first_hash, second_hash)
+        self.assertEqual(path.read_bytes(), b"a,b\n5,6\n")
+        self.assertEqual(dashboard_core.read_url_index()[self.url]["etag"], '"v2"')
+
+    def test_missing_cache_file_triggers_full_download(self):
+        _, path = dashboard_core.fetch_url(self.url)
+        path.unlink()
+        _, path = dashboard_core.fetch_url(self.url)
+        self.assertEqual(path.read_bytes(), self.server.body)
+        self.assertIsNone(self.server.requests[1].get("If-None-Match"))
+
+
+if __name__ == '__main__':
+    unittest.main()
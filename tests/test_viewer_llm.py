@@ -0,0 +1,123 @@
+# The metadata viewer's question answering against a local http.server
+# stand-in for the OpenAI endpoint (via OPENAI_BASE_URL): the prompt holds the
+# best BM25 documents within LLM_TOKEN_BUDGET, and a repeated question for
+# the same dataset and filters is answered from the cache.
+#
+#   python -m unittest discover tests      (or: python -m pytest tests)
+import csv
+import http.server
+import io
+import json
+import os
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from metadata_core import LLM_TOKEN_BUDGET, LLM_TOP_K  # noqa: E402
+
+QUESTION = "Welke documenten gaan over dijken?"
+RELEVANT = [f"doc_{i:03d}" for i in (3, 17, 24, 31, 38)]
+
+
+class ChatHandler(http.server.BaseHTTPRequestHandler):
+    # Answers every chat completion with a fixed message
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        data = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Stub-antwoord."}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def metadata_csv(n_docs=40):
+    # Long summaries, so the token budget binds before top_k does; only the
+    # RELEVANT documents are about dikes
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["file_key", "metadata_field", "metadata_value"])
+    for i in range(n_docs):
+        key = f"doc_{i:03d}"
+        topic = "dijken en dijkversterking langs de rivier" if key in RELEVANT else "gemeentelijke begroting en subsidies"
+        writer.writerow([key, "file_extension", "pdf"])
+        writer.writerow([key, "title", f"Rapport {i}"])
+        writer.writerow([key, "ai_summary", f"Dit rapport gaat over {topic}. " + "Aanvullende toelichting bij het rapport. " * 30])
+    return out.getvalue().encode()
+
+
+class AnswerQuestionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ChatHandler)
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.saved_env = {k: os.environ.get(k) for k in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+        os.environ["OPENAI_API_KEY"] = "test"
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{cls.server.server_port}/v1"
+
+    @classmethod
+    def tearDownClass(cls):
+        for k, v in cls.saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        # The client (and its base URL) and the answers are cached per process
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        self.server.requests.clear()
+        self.at = AppTest.from_file(str(ROOT / "viewer_12_35lc.py"), default_timeout=60)
+        self.at.run()
+        self.at.sidebar.file_uploader[0].upload("meta.csv", metadata_csv()).run()
+
+    def ask(self, question):
+        self.at.sidebar.text_area[0].set_value(question).run()
+        self.assertFalse(self.at.exception)
+        self.assertFalse(self.at.error)
+
+    def prompt_context(self, request):
+        prompt = request["messages"][0]["content"]
+        return json.loads(prompt.split("Metadata:\n", 1)[1].split("\n\nVraag:", 1)[0])
+
+    def test_prompt_holds_top_documents_within_budget(self):
+        self.ask(QUESTION)
+        self.assertEqual(len(self.server.requests), 1)
+        context = self.prompt_context(self.server.requests[0])
+        cost = sum(len(json.dumps({key: md}, indent=2)) // 4 for key, md in context.items())
+        self.assertLessEqual(cost, LLM_TOKEN_BUDGET)
+        self.assertLess(len(context), LLM_TOP_K)
+        self.assertEqual(list(context)[:len(RELEVANT)], RELEVANT)
+        self.assertIn(QUESTION, self.server.requests[0]["messages"][0]["content"])
+
+    def test_repeated_question_is_answered_from_cache(self):
+        self.ask(QUESTION)
+        self.at.run()
+        self.at.run()
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIn("Stub-antwoord.", "".join(m.value for m in self.at.markdown))
+        self.ask("Welke rapporten gaan over subsidies?")
+        self.assertEqual(len(self.server.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,24 +1,96 @@
 import os
+import hashlib
 import streamlit as st
-import pandas as pd
+import instrumentation
+import jobs
 import json
-from pathlib import Path
-from datetime import datetime
 import re
-from openai import OpenAI
+import tempfile
+import time
+from pathlib import Path
 from dotenv import load_dotenv
 
+# pandas (via metadata_core) en openai worden pas geladen als ze nodig zijn:
+# na een upload, respectievelijk bij de eerste vraag
+
 st.set_page_config(layout="wide")
 
 # Laad API key uit .env bestand
 load_dotenv("sleu.env")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+LLM_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
 
 # Initialiseer de gebruikersvraag in session_state
 if "user_question" not in st.session_state:
     st.session_state["user_question"] = ""
 
-def main():
+# OpenAI-client: eenmalig per proces aangemaakt, bij de eerste vraag.
+# OPENAI_BASE_URL kan naar een lokale, OpenAI-compatibele stand-in wijzen
+@st.cache_resource
+def get_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL"))
+
+
+# Metadata-store: eenmalig per upload (content hash) opgebouwd en gedeeld
+# tussen reruns
+@instrumentation.cached("load_metadata_store", st.cache_resource(max_entries=4))
+def load_metadata_store(file_hash, _uploaded_file):
+    from metadata_core import build_metadata_store
+    _uploaded_file.seek(0)
+    return build_metadata_store(_uploaded_file)
+
+
+# Antwoorden worden gecachet per (dataset, filterstand, vraag), zodat een
+# rerun met dezelfde vraag de API niet opnieuw aanroept
+@instrumentation.cached("answer_question", st.cache_data(show_spinner=False, max_entries=256))
+def answer_question(file_hash, filter_state, question, _store, _subset):
+    from metadata_core import retrieve_context
+    data_for_llm = retrieve_context(_store, _subset, question)
+    prompt = f"""
+Beantwoord kort en feitelijk op basis van onderstaande metadata (max 50 woorden).
+Metadata:
+{json.dumps(data_for_llm, indent=2)}
+
+Vraag: {question}
+Antwoord:
+"""
+    response = get_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=150
+    )
+    return response.choices[0].message.content, len(data_for_llm)
+
+
+# MDTO-export naar een bestand op schijf, voor de gedeelde job-pool. De
+# downloadknop leest het pas in als erop geklikt wordt.
+MDTO_DIR = Path(tempfile.gettempdir()) / "metadata_viewer"
+
+
+def mdto_file(key, filtered, progress=None):
+    from metadata_core import write_mdto_json
+    MDTO_DIR.mkdir(exist_ok=True)
+    path = MDTO_DIR / f"{hashlib.sha256(repr(key).encode()).hexdigest()}.mdto.json"
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, 'wb') as out:
+        write_mdto_json(filtered, progress=progress, out=out)
+    os.replace(tmp, path)
+    return path
+
+
+def prune_mdto_files():
+    # Exports die langer dan een job mee gaan niet meer gebruikt zijn
+    now = time.time()
+    for path in MDTO_DIR.glob("*"):
+        try:
+            if now - path.stat().st_mtime > jobs.JOB_TTL:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def main(prof):
     st.sidebar.header('Instellingen')
 
     st.markdown("""
@@ -43,8 +115,13 @@ def main():
         st.sidebar.info('Upload een CSV-bestand om te beginnen.')
         return
 
+    import pandas as pd
+    from metadata_core import LLM_FIELDS, select_rows, keyword_filter
+
+    prof.mark("parse")
     try:
-        df = pd.read_csv(uploaded_file)
+        file_hash = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        store = load_metadata_store(file_hash, uploaded_file)
     except Exception as e:
         st.sidebar.error(f"Kan CSV niet laden: {e}")
         return
@@ -60,78 +137,46 @@ def main():
         key="user_question_input"
     )
     
-    ext_map = df[df['metadata_field'] == 'file_extension']\
-        .set_index('file_key')['metadata_value'].to_dict()
-
-    unique_types = sorted(set(ext_map.values()))
+    unique_types = store['types']
     selected_types = st.sidebar.multiselect(
         'Selecteer bestandstypes om te tonen',
         ['Alles'] + unique_types,
         default=['Alles']
     )
-    allowed_keys = list(ext_map.keys()) if 'Alles' in selected_types else [k for k, v in ext_map.items() if v in selected_types]
-    df = df[df['file_key'].isin(allowed_keys)].copy()
+    allowed_types = unique_types if 'Alles' in selected_types else [t for t in selected_types if t != 'Alles']
 
-    all_fields = sorted(df['metadata_field'].unique())
+    all_fields = sorted(set().union(*(store['type_fields'].get(t, set()) for t in allowed_types)))
     selected_fields = st.sidebar.multiselect(
         'Selecteer metadata types om te tonen',
         all_fields,
         default=all_fields
     )
-    filtered = df[df['metadata_field'].isin(selected_fields)].copy()
 
-    ext_rows = pd.DataFrame([
-        {'file_key': k, 'metadata_field': 'file_extension', 'metadata_value': ext_map[k]}
-        for k in allowed_keys
-    ])
-    filtered = pd.concat([filtered, ext_rows], ignore_index=True)
-    filtered = filtered.drop_duplicates(subset=['file_key', 'metadata_field'], keep='first')
+    date_ranges = {}
+    for field in selected_fields:
+        if field not in store['date_index']:
+            continue
+        stamps = store['date_index'][field]['sorted_stamps']
+        min_dt, max_dt = pd.Timestamp(stamps[0]).date(), pd.Timestamp(stamps[-1]).date()
+        date_range = st.sidebar.date_input(f'Datum-range voor {field}', [min_dt, max_dt])
+        if len(date_range) == 2:
+            date_ranges[field] = date_range
+
+    prof.mark("filter")
+    filtered = select_rows(store, allowed_types, selected_fields, date_ranges)
 
     if kw:
-        if match_type == 'Exact':
-            mask = (
-                (filtered['metadata_field'].str.lower() == kw_lower) |
-                (filtered['metadata_value'].str.lower() == kw_lower)
-            )
-        else:
-            mask = (
-                filtered['metadata_field'].str.contains(kw, case=False, na=False) |
-                filtered['metadata_value'].str.contains(kw, case=False, na=False)
-            )
-        filtered = filtered[mask]
-
-    date_fields = [f for f in selected_fields if 'timestamp' in f or f.endswith('_created') or f.endswith('_modified')]
-    date_masks = []
-    for field in date_fields:
-        dt_values = pd.to_datetime(filtered['metadata_value'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-        if dt_values.notna().any():
-            field_mask = filtered['metadata_field'] == field
-            series = dt_values[field_mask]
-            if series.empty:
-                continue
-            min_dt, max_dt = series.min().date(), series.max().date()
-            start, end = st.sidebar.date_input(f'Datum-range voor {field}', [min_dt, max_dt])
-            mask_other = ~field_mask
-            mask_in_range = dt_values.dt.date.between(start, end)
-            date_masks.append(mask_other | mask_in_range)
-    if date_masks:
-        combined = date_masks[0]
-        for m in date_masks[1:]:
-            combined &= m
-        filtered = filtered[combined]
-
-    mdto_list = []
-    for fk, group in filtered.groupby('file_key'):
-        md = {row['metadata_field']: row['metadata_value'] for _, row in group.iterrows()}
-        mdto_list.append({'file_key': fk, 'metadata': md})
-    mdto_json = json.dumps({'MDTO': mdto_list}, ensure_ascii=False, indent=2)
-    st.sidebar.download_button(
-        'Export naar MDTO',
-        data=mdto_json,
-        file_name='metadata.mdto.json',
-        mime='application/json'
+        partial = match_type == 'Deeltekst'
+        filtered = keyword_filter(store, filtered, kw_lower, partial)
+
+    filter_state = (
+        tuple(allowed_types), tuple(selected_fields), kw, match_type,
+        tuple((f, str(start), str(end)) for f, (start, end) in sorted(date_ranges.items())),
     )
 
+    export_requested = st.sidebar.button('MDTO-export voorbereiden')
+    export_slot = st.sidebar.empty()
+
     st.markdown("""
         <style>
         h1, h4 {
@@ -146,29 +191,12 @@ def main():
     """, unsafe_allow_html=True)
 
     if user_question.strip():
-        filtered_subset = filtered[filtered['metadata_field'].isin(['ai_summary', 'image_description'])]
-        data_for_llm = filtered_subset.groupby('file_key').apply(
-            lambda group: {row['metadata_field']: row['metadata_value'] for _, row in group.iterrows()}
-        ).to_dict()
-
-        prompt = f"""
-Beantwoord kort en feitelijk op basis van onderstaande metadata (max 50 woorden).
-Metadata:
-{json.dumps(data_for_llm, indent=2)}
-
-Vraag: {user_question}
-Antwoord:
-"""
+        prof.mark("llm")
+        filtered_subset = filtered[filtered['metadata_field'].isin(LLM_FIELDS)]
 
         with st.spinner("Zoeken naar antwoord..."):
             try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.2,
-                    max_tokens=150
-                )
-                answer = response.choices[0].message.content
+                answer, n_docs = answer_question(file_hash, filter_state, user_question, store, filtered_subset)
                 st.markdown(f"""
                     <div style='margin-top: 2em; margin-bottom: 2em; padding: 1em; border: 1px solid #ccc; border-radius: 8px;'>
                         <h4 style='pointer-events: none;'>Vraag:</h4>
@@ -177,17 +205,38 @@ Antwoord:
                         <p>{answer}</p>
                     </div>
                 """, unsafe_allow_html=True)
+                st.caption(f"Antwoord gebaseerd op {n_docs} meest relevante documenten.")
             except Exception as e:
                 st.error(f"Er ging iets mis bij het ophalen van het antwoord: {e}")
 
-    for file_key, group in filtered.groupby('file_key'):
-        with st.expander(file_key, expanded=False):
+    if kw and match_type == 'Deeltekst':
+        pattern = re.compile(re.escape(kw), re.IGNORECASE)
+        def highlight_substring(v):
+            return pattern.sub(lambda m: f"<span style='background-color: yellow'>{m.group(0)}</span>", str(v))
+
+    prof.mark("render")
+    # Gepagineerde documentlijst: alleen de documenten op de huidige pagina
+    # krijgen een expander, en alleen opengeklapte expanders bouwen hun tabel
+    doc_rows = filtered.groupby('file_key', sort=True).indices
+    doc_keys = list(doc_rows)
+    c_info, c_size, c_page = st.columns([3, 1, 1])
+    page_size = c_size.selectbox('Documenten per pagina', [25, 50, 100, 250], key='page_size')
+    n_pages = max(1, -(-len(doc_keys) // page_size))
+    if st.session_state.get('page', 1) > n_pages:
+        st.session_state['page'] = n_pages
+    page = c_page.number_input('Pagina', min_value=1, max_value=n_pages, step=1, key='page')
+    c_info.caption(f"{len(doc_keys)} documenten, pagina {page} van {n_pages}")
+
+    start = (page - 1) * page_size
+    for file_key in doc_keys[start:start + page_size]:
+        expander = st.expander(str(file_key), expanded=False, key=f'doc_{file_key}', on_change='rerun')
+        if not expander.open:
+            continue
+        with expander:
+            group = filtered.iloc[doc_rows[file_key]]
             table = group[['metadata_field', 'metadata_value']].reset_index(drop=True)
             styled = table.style
             if kw and match_type == 'Deeltekst':
-                pattern = re.compile(re.escape(kw), re.IGNORECASE)
-                def highlight_substring(v):
-                    return pattern.sub(lambda m: f"<span style='background-color: yellow'>{m.group(0)}</span>", str(v))
                 styled = styled.format({
                     'metadata_field': highlight_substring,
                     'metadata_value': highlight_substring
@@ -200,5 +249,33 @@ Antwoord:
             html = styled.to_html(escape=False)
             st.markdown(f'<div style="overflow-x:auto;">{html}</div>', unsafe_allow_html=True)
 
+    # De export draait op de achtergrond en wordt pas na het overzicht
+    # afgewacht; een rerun met dezelfde filterstand pikt de lopende of
+    # klaargezette export weer op
+    prof.mark("export")
+    export_key = (file_hash, filter_state)
+    export_job = jobs.current('mdto_export')
+    if export_requested:
+        prune_mdto_files()
+        export_job = jobs.submit('mdto_export', export_key, mdto_file, export_key, filtered)
+    if export_job is not None and export_job.key == export_key:
+        with export_slot.container():
+            try:
+                mdto_path = jobs.wait(export_job, "MDTO-export...")
+                os.utime(mdto_path)
+                st.download_button(
+                    'Export naar MDTO',
+                    data=mdto_path.read_bytes,
+                    file_name='metadata.mdto.json',
+                    mime='application/json'
+                )
+            except Exception as e:
+                jobs.release('mdto_export')
+                st.error(f"MDTO-export mislukt: {e}")
+    elif export_job is not None:
+        jobs.release('mdto_export')
+
 if __name__ == '__main__':
-    main()
+    prof = instrumentation.begin("metadata_viewer")
+    main(prof)
+    prof.finish()